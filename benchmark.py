@@ -0,0 +1,247 @@
+######
+# Banco de pruebas de rendimiento: construye mundos sintéticos sobre la clase Asteroids y mide cuánto tarda cada frame de sus sistemas
+# Uso: python benchmark.py --output resultados.json [--compare anteriores.json] [--entity-store]
+import argparse
+import json
+import platform
+import subprocess
+import sys
+import tracemalloc
+from time import perf_counter
+
+import pygame
+from pygame.math import Vector2
+
+from oopAsteroids import Asteroids, Boss, BossLife, WorldSnapshot
+
+
+BOSS_LEVEL = lambda game: next(level for level in game._levels if level.phase == "boss_phase")
+
+
+def percentile(values, fraction): #Percentil por el método del rango más cercano
+    ordered = sorted(values)
+    index = max(0, min(len(ordered) - 1, int(round(fraction * len(ordered))) - 1))
+    return ordered[index]
+
+
+def fill_asteroids(game, count): #Reparte los asteroides entre las tres categorías
+    for i in range(count):
+        game._spawn(game._asteroids, game._pools["asteroid"].acquire(game.SIZE, game._star_ship, category=i % 3 + 1, rng=game._rng))
+
+
+def fill_bullets(game, count): #Mantiene una ráfaga del jugador de count balas disparando en todas direcciones
+    ship = game._star_ship
+    while len(game._bullets) < count:
+        ship.direction.rotate_ip(game._rng.uniform(0, 360))
+        game._spawn(game._bullets, game._pools["bullet"].acquire(ship, False), wrap=False)
+
+
+def fill_enemy_bullets(game, count):
+    while len(game._bulletsEnemigos) < count and game._escudos:
+        escudo = game._rng.choice(game._escudos)
+        game._spawn(game._bulletsEnemigos, game._pools["enemy_bullet"].acquire(escudo, True), wrap=False)
+
+
+def boss_fight(game, bullets, enemy_bullets): #El boss ya en su posición con la formación completa de 14 escudos
+    game._boss = Boss(game.SIZE, position=Vector2(512, 200))
+    game._boss.LIVES = 10 ** 6
+    game._boss.fight = False
+    game._boss.velocity = Vector2(-1, 0)
+    game._bossLife = BossLife(game.SIZE, game._boss, game.events)
+    game._escudos.extend(game._pools["escudo"].acquire(game.SIZE, position=Vector2(position)) for position in BOSS_LEVEL(game).escudos)
+    fill_bullets(game, bullets)
+    fill_enemy_bullets(game, enemy_bullets)
+
+
+class Scenario: #Un mundo sintético: cómo se construye, qué fase se ejecuta y qué se repone en cada frame
+    def __init__(self, name, phase, build, refill=None):
+        self.name = name
+        self.phase = phase
+        self.build = build
+        self.refill = refill
+
+
+SCENARIOS = [
+    Scenario("phase1_asteroids_100", "phase1", lambda g: fill_asteroids(g, 100)),
+    Scenario("phase1_asteroids_1000", "phase1", lambda g: fill_asteroids(g, 1000)),
+    Scenario("phase2_asteroids_300_bullets_50", "phase2", lambda g: fill_asteroids(g, 300),
+             lambda g: (fill_asteroids(g, 300 - len(g._asteroids)), fill_bullets(g, 50))),
+    Scenario("phase2_asteroids_2000_bullets_200", "phase2", lambda g: fill_asteroids(g, 2000),
+             lambda g: (fill_asteroids(g, 2000 - len(g._asteroids)), fill_bullets(g, 200))),
+    Scenario("boss_phase_shields_14_volley", "boss_phase", lambda g: boss_fight(g, 100, 7),
+             lambda g: (fill_bullets(g, 100), fill_enemy_bullets(g, 7))),
+    Scenario("boss_phase_shields_14_dense_volley", "boss_phase", lambda g: boss_fight(g, 500, 50),
+             lambda g: (fill_bullets(g, 500), fill_enemy_bullets(g, 50))),
+]
+
+
+def new_world(game, scenario, seed): #Partida nueva en el primer nivel de la fase del escenario, con los sistemas de ese nivel
+    game.restart(seed)
+    game._start_level(next(index for index, level in enumerate(game._levels) if level.phase == scenario.phase))
+    game._star_ship.LIVES = 10 ** 6 #La nave no muere durante la prueba
+    for asteroid in game._asteroids[:]: #Se quitan los asteroides iniciales de la partida
+        game._despawn(game._asteroids, asteroid)
+    scenario.build(game)
+
+
+def measure_snapshots(game, runs): #Coste de guardar y restaurar el mundo del escenario tal como ha quedado, sin contar el historial de rebobinado
+    snapshot_times, restore_times = [], []
+    for _ in range(runs):
+        start = perf_counter()
+        data = WorldSnapshot.capture(game)
+        middle = perf_counter()
+        WorldSnapshot.restore(game, data)
+        end = perf_counter()
+        snapshot_times.append((middle - start) * 1e6)
+        restore_times.append((end - middle) * 1e6)
+    return {"snapshot_us": percentile(snapshot_times, 0.5), "restore_us": percentile(restore_times, 0.5), "bytes": len(data)}
+
+
+TRACEMALLOC_FILTERS = [tracemalloc.Filter(False, tracemalloc.__file__)] #Sin los snapshots de tracemalloc, que se toman durante la medida
+
+
+def measure_allocations(game, scenario, frames, seed, counted): #Segunda pasada con tracemalloc: reservas de cada frame, memoria temporal y crecimiento neto; los bloques reservados se cuentan solo en los primeros counted frames, cada snapshot de tracemalloc es lento
+    new_world(game, scenario, seed)
+    tracemalloc.start()
+    blocks = sys.getallocatedblocks()
+    allocated, temporary = 0, []
+    counted = min(counted, frames)
+    for frame in range(frames):
+        if scenario.refill:
+            scenario.refill(game)
+        before = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS) if frame < counted else None
+        tracemalloc.reset_peak()
+        start, _ = tracemalloc.get_traced_memory()
+        game.update()
+        game._draw()
+        _, peak = tracemalloc.get_traced_memory()
+        temporary.append(peak - start)
+        if before is not None:
+            after = tracemalloc.take_snapshot().filter_traces(TRACEMALLOC_FILTERS)
+            allocated += sum(stat.count_diff for stat in after.compare_to(before, "lineno") if stat.count_diff > 0) #Bloques nuevos de cada línea; lo que otra línea libera no los compensa
+            del before, after
+    blocks = sys.getallocatedblocks() - blocks
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {"peak_memory_kb": peak / 1024,
+            "allocated_blocks_per_frame": allocated / counted if counted else 0.0,
+            "temporary_kb_per_frame": sum(temporary) / len(temporary) / 1024, #Pico de memoria dentro del frame sobre la del principio: cuenta también lo que se reserva y se libera en el mismo frame
+            "net_blocks_per_frame": blocks / frames} #Crecimiento neto del heap
+
+
+def run_scenario(game, scenario, frames, warmup, seed, allocation_frames): #Mide update y render de cada frame, y en una segunda pasada las reservas de memoria
+    new_world(game, scenario, seed)
+    update_times, render_times, checks, draw_calls, culled = [], [], [], [], []
+    for frame in range(warmup + frames):
+        if scenario.refill:
+            scenario.refill(game)
+        start = perf_counter()
+        game.update()
+        middle = perf_counter()
+        game._draw()
+        end = perf_counter()
+        if frame >= warmup:
+            update_times.append((middle - start) * 1000)
+            render_times.append((end - middle) * 1000)
+            checks.append(game._grid.checks)
+            draw_calls.append(game._queue.draw_calls)
+            culled.append(game._queue.culled)
+    entities = len(game._asteroids) + len(game._bullets) + len(game._escudos) + len(game._bulletsEnemigos)
+    snapshots = measure_snapshots(game, 20)
+    allocations = measure_allocations(game, scenario, frames, seed, allocation_frames)
+    total = [u + r for u, r in zip(update_times, render_times)]
+    summary = lambda values: {"mean": sum(values) / len(values),
+                              "p95": percentile(values, 0.95),
+                              "p99": percentile(values, 0.99)}
+    return {"frames": frames,
+            "entities": entities,
+            "update_ms": summary(update_times),
+            "render_ms": summary(render_times),
+            "frame_ms": summary(total),
+            "collision_checks_per_frame": sum(checks) / len(checks),
+            "draw_calls_per_frame": sum(draw_calls) / len(draw_calls),
+            "culled_per_frame": sum(culled) / len(culled),
+            "pools": game.pool_stats(),
+            **allocations,
+            "snapshot": snapshots}
+
+
+STARTUP_SCRIPT = """
+import json, sys
+from time import perf_counter
+start = perf_counter()
+import oopAsteroids
+oopAsteroids.Asteroids.ATLAS = sys.argv[1] or None
+game = oopAsteroids.Asteroids(headless=True)
+print(json.dumps({"startup": perf_counter() - start, "assets": game.asset_time}))
+"""
+
+
+def measure_startup(runs, atlas): #Arranque en un proceso nuevo cada vez, para que no cuenten las cachés del proceso actual
+    samples = [json.loads(subprocess.check_output([sys.executable, "-c", STARTUP_SCRIPT, atlas or ""], stderr=subprocess.DEVNULL).decode().splitlines()[-1])
+               for _ in range(runs)]
+    return {key: {"median_ms": sorted(sample[key] for sample in samples)[len(samples) // 2] * 1000,
+                  "min_ms": min(sample[key] for sample in samples) * 1000}
+            for key in ("startup", "assets")}
+
+
+def git_commit():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], stderr=subprocess.DEVNULL).decode().strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(previous, current): #Muestra la variación del tiempo medio por frame respecto a otros resultados
+    for name, result in current["scenarios"].items():
+        old = previous["scenarios"].get(name)
+        if old is None:
+            continue
+        ratio = result["frame_ms"]["mean"] / old["frame_ms"]["mean"]
+        print("%-40s %8.3f ms -> %8.3f ms  (x%.2f)" % (name, old["frame_ms"]["mean"], result["frame_ms"]["mean"], ratio))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark de las fases de Asteroids")
+    parser.add_argument("--frames", type=int, default=300)
+    parser.add_argument("--warmup", type=int, default=30)
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--allocation-frames", type=int, default=20, metavar="N", help="frames en los que se cuentan los bloques reservados con snapshots de tracemalloc")
+    parser.add_argument("--scenario", action="append", help="solo ejecuta los escenarios con este nombre")
+    parser.add_argument("--entity-store", action="store_true", help="usa el EntityStore de NumPy")
+    parser.add_argument("--startup", type=int, default=0, metavar="N", help="mide N arranques con los PNG y con el atlas (generado antes con oopAsteroids.py --build-atlas)")
+    parser.add_argument("--output", metavar="FICHERO", help="guarda los resultados en JSON")
+    parser.add_argument("--compare", metavar="FICHERO", help="compara con unos resultados anteriores")
+    args = parser.parse_args()
+
+    Asteroids.ENTITY_STORE = args.entity_store
+    game = Asteroids(headless=True, seed=args.seed)
+    results = {"commit": git_commit(),
+               "python": platform.python_version(),
+               "pygame": pygame.version.ver,
+               "entity_store": game._store is not None,
+               "scenarios": {}}
+    if args.startup:
+        results["startup"] = {"png": measure_startup(args.startup, None),
+                              "atlas": measure_startup(args.startup, Asteroids.ATLAS)}
+        for name, startup in results["startup"].items():
+            print("%-40s arranque %7.1f ms  imágenes %7.1f ms" % ("startup_" + name, startup["startup"]["median_ms"], startup["assets"]["median_ms"]))
+    for scenario in SCENARIOS:
+        if args.scenario and scenario.name not in args.scenario:
+            continue
+        result = run_scenario(game, scenario, args.frames, args.warmup, args.seed, args.allocation_frames)
+        results["scenarios"][scenario.name] = result
+        print("%-40s update %7.3f ms (p99 %7.3f)  render %7.3f ms (p99 %7.3f)  %5d entidades  snapshot %6.0f µs  restore %6.0f µs" %
+              (scenario.name, result["update_ms"]["mean"], result["update_ms"]["p99"],
+               result["render_ms"]["mean"], result["render_ms"]["p99"], result["entities"],
+               result["snapshot"]["snapshot_us"], result["snapshot"]["restore_us"]))
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(results, file, indent=2)
+    if args.compare:
+        with open(args.compare) as file:
+            compare(json.load(file), results)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,253 @@
+######
+# Entorno para bots y barridos de equilibrado: reset/step al estilo gym sobre la clase Asteroids en modo headless,
+# y un VectorEnv que reparte N entornos entre varios procesos y devuelve observaciones y recompensas en memoria compartida
+# Uso: python env.py --envs 8 --workers 4 --steps 2000
+import argparse
+import multiprocessing
+import os
+from heapq import nsmallest
+from multiprocessing import shared_memory
+from time import perf_counter
+
+import numpy as np
+
+from oopAsteroids import Actions, Asteroids
+
+
+NEAREST_ASTEROIDS = 16 #Asteroides más cercanos que aparecen en la observación
+NEAREST_BULLETS = 8 #Balas enemigas más cercanas
+NEAREST_ESCUDOS = 8 #Escudos más cercanos
+OBS_SIZE = 8 + 4 + NEAREST_ASTEROIDS * 5 + NEAREST_BULLETS * 4 + NEAREST_ESCUDOS * 2
+ACTION_MASK = Actions.SHOOT | Actions.RIGHT | Actions.LEFT | Actions.UP | Actions.DOWN #Las acciones válidas son cualquier combinación de estos bits
+NUM_ACTIONS = ACTION_MASK + 1
+
+
+class AsteroidsEnv: #Una partida headless con la interfaz reset()/step(action) de gym, sin ventana ni reloj
+    REWARDS = {"destroyed": 1.0, #Por cada asteroide o escudo destruido
+               "boss_hit": 5.0, #Por cada vida que pierde el boss
+               "life_lost": -10.0, #Por cada vida que pierde la nave
+               "victory": 100.0}
+
+    def __init__(self, seed=None, frame_skip=1, max_steps=None, entity_store=False, out=None):
+        self.game = Asteroids(headless=True, seed=seed, ENTITY_STORE=entity_store, REWIND_SECONDS=0, RECORD=False) #En entrenamiento no se graba la partida ni se guarda historial para rebobinar
+        self.frame_skip = frame_skip #Frames de juego que se repite cada acción
+        self.max_steps = max_steps #Pasos tras los que se corta el episodio (truncated)
+        self.steps = 0
+        self.episode_return = 0.0 #Recompensa acumulada en el episodio actual
+        self._obs = np.zeros(OBS_SIZE, dtype=np.float32) if out is None else out #Las observaciones se escriben siempre en este array, que puede ser una fila de la memoria compartida
+
+    def reset(self, seed=None): #Comienza un episodio nuevo y devuelve (observación, info)
+        self.game.restart(seed)
+        self.steps = 0
+        self.episode_return = 0.0
+        return self.observation(), self._info()
+
+    def step(self, action): #Aplica la acción durante frame_skip frames y devuelve (observación, recompensa, terminated, truncated, info)
+        game = self.game
+        ship = game._star_ship
+        action = int(action) & ACTION_MASK
+        reward = 0.0
+        for _ in range(self.frame_skip):
+            lives, destroyed = ship.LIVES, game.destroyed
+            boss_lives = game._boss.LIVES if game._boss else 0
+            game.step(action)
+            reward += self.REWARDS["destroyed"] * (game.destroyed - destroyed)
+            reward += self.REWARDS["life_lost"] * (lives - ship.LIVES)
+            if game._boss:
+                reward += self.REWARDS["boss_hit"] * max(0, boss_lives - game._boss.LIVES)
+            if game.is_over():
+                if game._phase == "victory":
+                    reward += self.REWARDS["victory"]
+                break
+        self.steps += 1
+        self.episode_return += reward
+        terminated = game.is_over()
+        truncated = not terminated and self.max_steps is not None and self.steps >= self.max_steps
+        return self.observation(), reward, terminated, truncated, self._info()
+
+    def _info(self):
+        return {"phase": self.game._phase, "frame": self.game.frame, "lives": self.game._star_ship.LIVES}
+
+    def observation(self): #Vector de OBS_SIZE float32 normalizado al tamaño de la pantalla: nave, boss y los objetos más cercanos relativos a la nave
+        game = self.game
+        obs = self._obs
+        obs[:] = 0
+        width, height = game.SIZE
+        ship = game._star_ship
+        origin = ship.position
+        obs[0:8] = (origin.x / width, origin.y / height, ship.velocity.x, ship.velocity.y,
+                    ship.direction.x, ship.direction.y, ship.LIVES, ship.INMUNITY > 0)
+        if game._boss is not None:
+            boss = game._boss
+            obs[8:12] = (1.0, (boss.position.x - origin.x) / width, (boss.position.y - origin.y) / height, boss.LIVES)
+        i = 12
+        distance = lambda obj: origin.distance_squared_to(obj.position)
+        for asteroid in nsmallest(NEAREST_ASTEROIDS, game._asteroids, key=distance):
+            offset = asteroid.position - origin
+            velocity = asteroid.velocity
+            obs[i:i + 5] = (offset.x / width, offset.y / height, velocity.x, velocity.y, asteroid.CATEGORY)
+            i += 5
+        i = 12 + NEAREST_ASTEROIDS * 5
+        for bullet in nsmallest(NEAREST_BULLETS, game._bulletsEnemigos, key=distance):
+            offset = bullet.position - origin
+            velocity = bullet.velocity
+            obs[i:i + 4] = (offset.x / width, offset.y / height, velocity.x, velocity.y)
+            i += 4
+        i = 12 + NEAREST_ASTEROIDS * 5 + NEAREST_BULLETS * 4
+        for escudo in nsmallest(NEAREST_ESCUDOS, game._escudos, key=distance):
+            offset = escudo.position - origin
+            obs[i:i + 2] = (offset.x / width, offset.y / height)
+            i += 2
+        return obs
+
+
+class SharedArrays: #Arrays de NumPy de todos los entornos sobre bloques de memoria compartida, los mismos en el proceso principal y en los trabajadores
+    LAYOUT = (("obs", np.float32, (OBS_SIZE,)),
+              ("reward", np.float32, ()),
+              ("terminated", np.bool_, ()),
+              ("truncated", np.bool_, ()),
+              ("action", np.uint8, ()))
+
+    def __init__(self, num_envs, names=None):
+        self.blocks = {}
+        self.arrays = {}
+        for name, dtype, shape in self.LAYOUT:
+            shape = (num_envs,) + shape
+            size = max(1, int(np.prod(shape)) * np.dtype(dtype).itemsize)
+            if names is None:
+                block = shared_memory.SharedMemory(create=True, size=size)
+            else:
+                block = shared_memory.SharedMemory(name=names[name])
+            self.blocks[name] = block
+            self.arrays[name] = np.ndarray(shape, dtype=dtype, buffer=block.buf)
+
+    def names(self):
+        return {name: block.name for name, block in self.blocks.items()}
+
+    def close(self, unlink=False):
+        self.arrays.clear() #Hay que soltar las vistas antes de cerrar los bloques
+        for block in self.blocks.values():
+            block.close()
+            if unlink:
+                block.unlink()
+        self.blocks.clear()
+
+
+def _run_envs(envs, first, arrays, command): #Ejecuta un comando sobre un grupo de entornos escribiendo en los arrays compartidos (cada entorno escribe su observación en su fila); devuelve los episodios terminados
+    episodes = []
+    reward, terminated, truncated, action = (arrays[name] for name in ("reward", "terminated", "truncated", "action"))
+    for offset, env in enumerate(envs):
+        i = first + offset
+        if command == "reset":
+            env.reset()
+            reward[i], terminated[i], truncated[i] = 0.0, False, False
+        else:
+            _, reward[i], terminated[i], truncated[i], info = env.step(action[i])
+            if terminated[i] or truncated[i]: #Al terminar un episodio el entorno se reinicia solo y la observación es ya la del nuevo
+                info.update(env=i, episode_return=env.episode_return, episode_steps=env.steps)
+                episodes.append(info)
+                env.reset()
+    return episodes
+
+
+def _worker(conn, names, num_envs, first, seeds, kwargs): #Proceso trabajador: sus entornos son las filas first..first+len(seeds) de los arrays compartidos
+    shared = SharedArrays(num_envs, names)
+    envs = [AsteroidsEnv(seed=seed, out=shared.arrays["obs"][first + i], **kwargs) for i, seed in enumerate(seeds)]
+    try:
+        while True:
+            command = conn.recv()
+            if command == "close":
+                break
+            conn.send(_run_envs(envs, first, shared.arrays, command))
+    finally:
+        shared.close()
+        conn.close()
+
+
+class VectorEnv: #num_envs partidas repartidas entre workers procesos; step(actions) devuelve arrays apilados de todos los entornos
+    def __init__(self, num_envs, workers=None, seed=0, context="spawn", **kwargs):
+        self.num_envs = num_envs
+        self.workers = min(num_envs, workers if workers is not None else os.cpu_count() or 1)
+        self._shared = SharedArrays(num_envs)
+        self._processes = []
+        self._conns = []
+        self._local = None
+        seeds = [seed + i for i in range(num_envs)]
+        if self.workers == 0: #Sin procesos: todos los entornos en el proceso actual, útil para medir y depurar
+            self._local = [AsteroidsEnv(seed=s, out=self._shared.arrays["obs"][i], **kwargs) for i, s in enumerate(seeds)]
+            return
+        ctx = multiprocessing.get_context(context)
+        shard = -(-num_envs // self.workers)
+        for first in range(0, num_envs, shard):
+            parent, child = ctx.Pipe()
+            process = ctx.Process(target=_worker, args=(child, self._shared.names(), num_envs, first, seeds[first:first + shard], kwargs), daemon=True)
+            process.start()
+            child.close()
+            self._processes.append(process)
+            self._conns.append(parent)
+
+    def _command(self, command):
+        if self._local is not None:
+            return _run_envs(self._local, 0, self._shared.arrays, command)
+        for conn in self._conns:
+            conn.send(command)
+        episodes = []
+        for conn in self._conns:
+            episodes.extend(conn.recv())
+        return episodes
+
+    def reset(self): #Observaciones iniciales, array (num_envs, OBS_SIZE)
+        self._command("reset")
+        return self._shared.arrays["obs"]
+
+    def step(self, actions): #Devuelve (obs, reward, terminated, truncated, episodes); los arrays son vistas de la memoria compartida que se sobrescriben en el siguiente paso
+        self._shared.arrays["action"][:] = actions
+        episodes = self._command("step")
+        arrays = self._shared.arrays
+        return arrays["obs"], arrays["reward"], arrays["terminated"], arrays["truncated"], episodes
+
+    def close(self):
+        for conn in self._conns:
+            conn.send("close")
+        for process in self._processes:
+            process.join()
+        for conn in self._conns:
+            conn.close()
+        self._conns.clear()
+        self._processes.clear()
+        if self._shared.blocks:
+            self._shared.close(unlink=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+
+def main(): #Mide pasos por segundo con acciones aleatorias
+    parser = argparse.ArgumentParser(description="Rendimiento del entorno vectorizado de Asteroids")
+    parser.add_argument("--envs", type=int, default=8)
+    parser.add_argument("--workers", type=int, default=None, help="procesos trabajadores, 0 para ejecutar todo en este proceso (por defecto uno por núcleo)")
+    parser.add_argument("--steps", type=int, default=1000, help="pasos de cada entorno")
+    parser.add_argument("--frame-skip", type=int, default=1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--entity-store", action="store_true", help="usa el EntityStore de NumPy")
+    args = parser.parse_args()
+
+    rng = np.random.default_rng(args.seed)
+    with VectorEnv(args.envs, workers=args.workers, seed=args.seed, frame_skip=args.frame_skip, entity_store=args.entity_store) as env:
+        env.reset()
+        episodes = []
+        start = perf_counter()
+        for _ in range(args.steps):
+            episodes.extend(env.step(rng.integers(0, NUM_ACTIONS, args.envs))[4])
+        elapsed = perf_counter() - start
+        cores = max(1, min(env.workers, os.cpu_count() or 1))
+    steps = args.envs * args.steps
+    print("%d entornos, %d procesos: %d pasos en %.2f s, %.0f pasos/s, %.0f pasos/s por núcleo, %d episodios terminados" %
+          (args.envs, env.workers, steps, elapsed, steps / elapsed, steps / elapsed / cores, len(episodes)))
+
+
+if __name__ == '__main__':
+    main()
@@ -1,31 +1,1352 @@
 ######
 # Version del tutorial de Real Python: https://realpython.com/asteroids-game-python/
+import os
+import argparse
+import cProfile
+import csv
+import hashlib
+import heapq
+import io
+import json
+import mmap
+import random
+import struct
+import weakref
+import zlib
 import pygame
 from pygame.math import Vector2
 from pygame.transform import rotozoom, smoothscale
-from random import randrange, choice
+from collections import OrderedDict, deque
+from itertools import count
+from concurrent.futures import ThreadPoolExecutor
 from math import copysign
+from time import perf_counter
+try: #NumPy es opcional, solo hace falta para el EntityStore
+    import numpy as np
+except ImportError:
+    np = None
 
 def buscar_escudo(bulletsEnemigos, escudo): #Esta funcion comprueba si el escudo iterador coincide con el escudo desde el que se disparó la bala iteradora, de manera que 
     for bullet in bulletsEnemigos: #la bala siempre es disparada por el mismo escudo
-        if bullet.LAUNCHER == escudo:
+        if bullet.LAUNCHER == escudo and not bullet._disabled:
             return False
     return True
 
+class AssetCache: #Registro central de imágenes, cada sprite se lee de disco y se convierte una única vez y todos los objetos comparten la misma Surface
+    IMAGES_DIR = "images/"
+
+    def __init__(self):
+        self._surfaces = {} #Las claves son (nombre, with_alpha), ya que convert() y convert_alpha() dan Surfaces distintas
+        self._prefetched = {} #nombre -> Future con la imagen leída en segundo plano, aún sin convertir
+        self.hits = 0
+        self.misses = 0
+        self.load_time = 0.0 #Segundos acumulados leyendo y convirtiendo imágenes
+
+    def get(self, filename, with_alpha=True):
+        key = (filename, with_alpha)
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            return surface
+        self.misses += 1
+        start = perf_counter()
+        future = self._prefetched.pop(filename, None)
+        image = future.result() if future is not None else pygame.image.load(self.IMAGES_DIR + filename + ".png") #Si se pidió antes de tiempo solo falta convertirla, que tiene que hacerse en este hilo
+        surface = image.convert_alpha() if with_alpha else image.convert()
+        self.load_time += perf_counter() - start
+        self._surfaces[key] = surface
+        return surface
+
+    def add_atlas(self, atlas): #Registra los sprites de un SpriteAtlas, que ya no hará falta leer de disco
+        for name, surface in atlas.sprites.items():
+            self._surfaces[(name, True)] = surface
+
+    def preload(self, filenames, with_alpha=True): #Carga de golpe una lista de sprites, pensado para llamarse antes del primer frame
+        for filename in filenames:
+            self.get(filename, with_alpha)
+
+    def prefetch(self, filenames): #Lee y decodifica los PNG en el hilo de precarga, sin bloquear el frame actual
+        for filename in filenames:
+            if (filename, True) not in self._surfaces and filename not in self._prefetched:
+                self._prefetched[filename] = PRELOAD.submit(pygame.image.load, self.IMAGES_DIR + filename + ".png")
+
+    def clear(self): #Vacía la caché, necesario si se vuelve a crear la ventana, ya que las Surfaces convertidas dependen del modo de pantalla
+        self._surfaces.clear()
+        self._prefetched.clear()
+
+    def stats(self):
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "load_time": self.load_time,
+                "cached": len(self._surfaces),
+                "prefetched": len(self._prefetched)}
+
+PRELOAD = ThreadPoolExecutor(max_workers=1, thread_name_prefix="preload") #Hilo de precarga de imágenes y música, se crea la primera vez que se usa
+ASSETS = AssetCache() #Caché compartida por todo el juego
+
+class SpriteAtlas: #Todos los sprites empaquetados en una sola imagen más el fondo ya escalado, guardados como píxeles RGBA sin comprimir para no decodificar PNGs al arrancar
+    MAGIC = b"ATLS"
+    VERSION = 1
+    HEADER = struct.Struct("<4sBHHHHH") #magic, versión, ancho y alto del atlas, ancho y alto del fondo, número de sprites
+    ENTRY = struct.Struct("<32sHHHHHHHH") #nombre, x, y, ancho y alto en el atlas, posición del recorte y tamaño original del sprite
+    PADDING = 1 #Píxeles transparentes entre sprites
+
+    def __init__(self, sprites, background):
+        self.sprites = sprites #nombre -> Surface (subsurface del atlas, o una copia de su tamaño original si tenía bordes transparentes)
+        self.background = background
+
+    @classmethod
+    def build(cls, path, names, background, size, width=2048): #Empaqueta los sprites por filas, de más alto a más bajo, sin sus bordes transparentes, y guarda también el fondo escalado a size
+        surfaces = {name: ASSETS.get(name) for name in names}
+        trims = {name: surface.get_bounding_rect() for name, surface in surfaces.items()} #Las barras de vida del boss ocupan toda la pantalla aunque casi todo es transparente
+        width = max([width] + [trim.width for trim in trims.values()])
+        rects = {}
+        x = y = row = 0
+        for name in sorted(names, key=lambda name: (-trims[name].height, name)):
+            w, h = trims[name].size
+            if x + w > width: #Fila llena, se empieza otra debajo
+                x, y, row = 0, y + row + cls.PADDING, 0
+            rects[name] = pygame.Rect(x, y, w, h)
+            x += w + cls.PADDING
+            row = max(row, h)
+        atlas = pygame.Surface((width, y + row), pygame.SRCALPHA)
+        for name, rect in rects.items():
+            atlas.blit(surfaces[name], rect, trims[name], special_flags=pygame.BLEND_RGBA_MAX) #Sobre un fondo a cero MAX copia los píxeles tal cual, también el color de los transparentes
+        background = smoothscale(ASSETS.get(background), [int(value) for value in size])
+        with open(path, "wb") as file:
+            file.write(cls.HEADER.pack(cls.MAGIC, cls.VERSION, atlas.get_width(), atlas.get_height(), *background.get_size(), len(rects)))
+            for name, rect in rects.items():
+                file.write(cls.ENTRY.pack(name.encode(), *rect, *trims[name].topleft, *surfaces[name].get_size()))
+            file.write(pygame.image.tobytes(atlas, "RGBA"))
+            file.write(pygame.image.tobytes(background, "RGBA"))
+        return rects
+
+    @classmethod
+    def load(cls, path, size, sources=()): #Lee el atlas proyectando el fichero en memoria; devuelve None si no existe, no es válido, el fondo tiene otro tamaño o alguna imagen de sources es más nueva
+        try:
+            modified = os.path.getmtime(path)
+            if any(os.path.getmtime(source) > modified for source in sources):
+                return None
+            with open(path, "rb") as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                magic, version, width, height, bg_width, bg_height, count = cls.HEADER.unpack_from(data)
+                if magic != cls.MAGIC or version != cls.VERSION or (bg_width, bg_height) != tuple(int(value) for value in size):
+                    return None
+                offset = cls.HEADER.size
+                entries = []
+                for _ in range(count):
+                    entries.append(cls.ENTRY.unpack_from(data, offset))
+                    offset += cls.ENTRY.size
+                with memoryview(data) as view: #frombuffer no copia los píxeles; convert_alpha hace la única copia, ya en el formato de la pantalla
+                    atlas = pygame.image.frombuffer(view[offset:offset + width * height * 4], (width, height), "RGBA").convert_alpha()
+                    offset += width * height * 4
+                    background = pygame.image.frombuffer(view[offset:offset + bg_width * bg_height * 4], (bg_width, bg_height), "RGBA").convert_alpha()
+        except (OSError, ValueError, struct.error):
+            return None
+        sprites = {}
+        for name, x, y, w, h, trim_x, trim_y, full_w, full_h in entries:
+            sprite = atlas.subsurface((x, y, w, h))
+            if (w, h) != (full_w, full_h): #Se le devuelven los bordes transparentes para que se dibuje en el mismo sitio que el PNG
+                full = pygame.Surface((full_w, full_h), pygame.SRCALPHA).convert_alpha()
+                full.fill((0, 0, 0, 0))
+                full.blit(sprite, (trim_x, trim_y), special_flags=pygame.BLEND_RGBA_MAX)
+                sprite = full
+            sprites[name.rstrip(b"\0").decode()] = sprite
+        return cls(sprites, background)
+
 def load_image(filename, with_alpha=True):
-    image = pygame.image.load("images/" + filename + ".png")
-    return image.convert_alpha() if with_alpha else image.convert()
+    return ASSETS.get(filename, with_alpha)
+
+class SoundBank: #Decodifica cada efecto de sonido una única vez al arrancar, en lugar de crear un pygame.mixer.Sound en cada disparo
+    MUSIC_DIR = "music/"
+
+    def __init__(self):
+        self._sounds = {}
+        self.decode_time = 0.0 #Segundos acumulados decodificando los .ogg
+
+    def get(self, name):
+        sound = self._sounds.get(name)
+        if sound is None:
+            start = perf_counter()
+            sound = pygame.mixer.Sound(self.MUSIC_DIR + name + ".ogg")
+            self.decode_time += perf_counter() - start
+            self._sounds[name] = sound
+        return sound
+
+    def preload(self, names):
+        for name in names:
+            self.get(name)
+
+    def clear(self):
+        self._sounds.clear()
+
+SOUNDS = SoundBank() #Banco de sonidos compartido por todo el juego
+
+class MusicPlayer: #Música de fondo por streaming con pygame.mixer.music; el fichero se lee antes en el hilo de precarga y el mixer se inicia una sola vez
+    def __init__(self, volume=0.1):
+        self.volume = volume
+        self.current = None #Canción que está sonando
+        self._files = {} #ruta -> Future con el contenido del fichero
+        self.load_time = 0.0 #Segundos que ha estado bloqueado el juego cambiando de canción
+
+    def prefetch(self, path):
+        if path not in self._files:
+            self._files[path] = PRELOAD.submit(self._read, path)
+
+    @staticmethod
+    def _read(path):
+        with open(path, "rb") as file:
+            return file.read()
+
+    def play(self, path, loops=-1): #loops=-1 para que se repita indefinidamente
+        if path == self.current:
+            return
+        start = perf_counter()
+        self.prefetch(path)
+        try:
+            pygame.mixer.music.load(io.BytesIO(self._files[path].result()), path.rsplit(".", 1)[-1])
+        except (OSError, pygame.error) as error: #Si falta la canción se sigue con la que está sonando
+            del self._files[path]
+            print("No se puede reproducir %s: %s" % (path, error))
+            return
+        finally:
+            self.load_time += perf_counter() - start
+        pygame.mixer.music.set_volume(self.volume)
+        pygame.mixer.music.play(loops)
+        self.current = path
+
+MUSIC = MusicPlayer() #Reproductor de música compartido por todo el juego
+
+class RotationAtlas: #Guarda los sprites ya rotados por (sprite, ángulo cuantizado) para no llamar a rotozoom en cada frame
+    def __init__(self, resolution=3, max_entries=2048):
+        self.resolution = resolution #Grados entre dos ángulos consecutivos del atlas
+        self.max_entries = max_entries #Límite de Surfaces guardadas, al superarlo se descarta la menos usada recientemente
+        self._surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def quantize(self, angle):
+        return (round(angle / self.resolution) * self.resolution) % 360
+
+    def get(self, sprite, angle):
+        key = (sprite, self.quantize(angle))
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = rotozoom(sprite, key[1], 1.0)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def prerender(self, sprite): #Rellena el atlas con todas las rotaciones de un sprite
+        for step in range(0, 360, self.resolution):
+            self.get(sprite, step)
+
+    def clear(self):
+        self._surfaces.clear()
+
+    def stats(self):
+        return {"hits": self.hits,
+                "misses": self.misses,
+                "cached": len(self._surfaces)}
+
+ROTATIONS = RotationAtlas() #Atlas compartido, su resolución coincide con StarShip.MANEUVERABILITY
+
+class ObjectPool: #Reutiliza objetos de una clase en lugar de crearlos y destruirlos; acquire() vuelve a llamar a __init__ con los nuevos argumentos
+    def __init__(self, cls, max_size=1024):
+        self.cls = cls
+        self.max_size = max_size #Objetos libres que se guardan como máximo
+        self._free = []
+        self._pending = [] #Liberados en este frame, no se reutilizan hasta recycle() por si alguien aún los tiene en una lista
+        self.created = 0
+        self.reused = 0
+        self.in_use = 0
+
+    def acquire(self, *args, **kwargs):
+        if self._free:
+            obj = self._free.pop()
+            obj.__init__(*args, **kwargs)
+            self.reused += 1
+        else:
+            obj = self.cls(*args, **kwargs)
+            self.created += 1
+        obj._pool = self
+        self.in_use += 1
+        return obj
+
+    def release(self, obj):
+        obj._pool = None
+        self.in_use -= 1
+        self._pending.append(obj)
+
+    def recycle(self): #Se llama al comienzo de cada frame, cuando los objetos liberados ya no están en ninguna lista
+        self._free.extend(self._pending[:self.max_size - len(self._free)])
+        self._pending.clear()
+
+    def stats(self):
+        return {"created": self.created,
+                "reused": self.reused,
+                "in_use": self.in_use,
+                "free": len(self._free) + len(self._pending)}
+
+class SpatialHash: #Rejilla uniforme para la fase amplia de colisiones, solo se hace el test de círculos con los objetos de las celdas cercanas
+    def __init__(self, screen_size, cell_size=64):
+        self.cell_size = cell_size
+        self.columns = max(1, int(screen_size.x // cell_size))
+        self.rows = max(1, int(screen_size.y // cell_size))
+        self._cells = {}
+        self.checks = 0 #Tests de círculos hechos desde la última reconstrucción, es decir, en el frame actual
+
+    def _cell_range(self, obj): #Celdas que ocupa el círculo del objeto, con módulo para que los bordes de la pantalla sean vecinos como en GameObject.update
+        x0 = int((obj.position.x - obj.radius) // self.cell_size)
+        x1 = int((obj.position.x + obj.radius) // self.cell_size)
+        y0 = int((obj.position.y - obj.radius) // self.cell_size)
+        y1 = int((obj.position.y + obj.radius) // self.cell_size)
+        for x in range(x0, min(x1, x0 + self.columns - 1) + 1):
+            for y in range(y0, min(y1, y0 + self.rows - 1) + 1):
+                yield x % self.columns, y % self.rows
+
+    def rebuild(self, objects): #Se llama una vez por frame con los objetos ya actualizados
+        self._cells.clear()
+        self.checks = 0
+        for index, obj in enumerate(objects):
+            for cell in self._cell_range(obj):
+                self._cells.setdefault(cell, []).append((index, obj))
+
+    def query(self, obj): #Candidatos cercanos, en el mismo orden que en la lista original para que el resultado sea el mismo que recorriéndola entera
+        found = {}
+        for cell in self._cell_range(obj):
+            for index, other in self._cells.get(cell, ()):
+                found[index] = other
+        return [found[index] for index in sorted(found)]
+
+    def collisions(self, obj): #Candidatos que realmente colisionan con obj según GameObject.collides_with, ignorando los ya deshabilitados
+        hits = []
+        for other in self.query(obj):
+            if other._disabled:
+                continue
+            self.checks += 1
+            if other.collides_with(obj):
+                hits.append(other)
+        return hits
+
+class EntityStore: #Almacén de asteroides y balas en arrays contiguos de NumPy (posición, velocidad, radio, flags) para mover, envolver, descartar y colisionar todos a la vez
+    BLOCK = 1 << 16 #Celdas como máximo de cada bloque de la matriz de colisiones, para no crear matrices enormes con muchos objetos
+
+    def __init__(self, screen_size, capacity=256):
+        self.screen_size = screen_size
+        self.position = np.zeros((capacity, 2))
+        self.velocity = np.zeros((capacity, 2))
+        self.radius = np.zeros(capacity)
+        self.wrap = np.zeros(capacity, dtype=bool) #True para los objetos que reaparecen por el otro lado de la pantalla, False para las balas
+        self.objects = [None] * capacity #Objeto dueño de cada fila
+        self.count = 0
+        self.checks = 0 #Tests de círculos hechos en el frame actual
+
+    def _grow(self, needed):
+        capacity = len(self.objects)
+        while capacity < needed:
+            capacity *= 2
+        for name in ("position", "velocity", "radius", "wrap"):
+            old = getattr(self, name)
+            new = np.zeros((capacity,) + old.shape[1:], dtype=old.dtype)
+            new[:self.count] = old[:self.count]
+            setattr(self, name, new)
+        self.objects.extend([None] * (capacity - len(self.objects)))
+
+    def attach(self, obj, wrap=True): #El objeto pasa a leer y escribir su posición y velocidad en una fila del almacén
+        if self.count == len(self.objects):
+            self._grow(self.count + 1)
+        row = self.count
+        self.position[row] = obj.position
+        self.velocity[row] = obj.velocity
+        self.radius[row] = obj.radius
+        self.wrap[row] = wrap
+        self.objects[row] = obj
+        obj._store, obj._row = self, row
+        self.count += 1
+        return obj
+
+    def attach_all(self, objects, motion, wrap=True): #Lo mismo que attach() para una lista entera, con una sola copia a los arrays; motion es un array (n, 4) con x, y, vx, vy de cada objeto
+        start, end = self.count, self.count + len(objects)
+        if end > len(self.objects):
+            self._grow(end)
+        if objects:
+            self.position[start:end] = motion[:, :2]
+            self.velocity[start:end] = motion[:, 2:]
+            self.radius[start:end] = [obj.radius for obj in objects]
+            self.wrap[start:end] = wrap
+        for row, obj in enumerate(objects, start):
+            self.objects[row] = obj
+            obj._store, obj._row = self, row
+        self.count = end
+
+    def detach(self, obj): #Devuelve al objeto sus propios Vector2 y ocupa su fila con la última para que los arrays sigan siendo contiguos
+        row = obj._row
+        obj._position = Vector2(*self.position[row])
+        obj._velocity = Vector2(*self.velocity[row])
+        obj._store, obj._row = None, None
+        last = self.count - 1
+        if row != last:
+            self.position[row] = self.position[last]
+            self.velocity[row] = self.velocity[last]
+            self.radius[row] = self.radius[last]
+            self.wrap[row] = self.wrap[last]
+            self.objects[row] = self.objects[last]
+            self.objects[row]._row = row
+        self.objects[last] = None
+        self.count = last
+        return obj
+
+    def read(self, objects): #Posición (n, 2), velocidad (n, 2) y radio de una lista de objetos sin crear un Vector2 por objeto; los que ya no están en el almacén aportan sus propios Vector2
+        rows = np.fromiter((-1 if obj._row is None else obj._row for obj in objects), dtype=int, count=len(objects))
+        position, velocity, radius = self.position[rows], self.velocity[rows], self.radius[rows]
+        for i in np.flatnonzero(rows < 0):
+            obj = objects[i]
+            position[i], velocity[i], radius[i] = obj._position, obj._velocity, obj.radius
+        return position, velocity, radius
+
+    def integrate(self): #Equivale a GameObject.move en todas las filas
+        self.position[:self.count] += self.velocity[:self.count]
+
+    def wrap_all(self): #Envuelve las filas que tienen wrap, con la misma cadena if/elif que GameObject.wrap
+        n = self.count
+        position = self.position[:n]
+        radius = self.radius[:n]
+        wrap = self.wrap[:n]
+        width = self.screen_size.x + radius * 2
+        height = self.screen_size.y + radius * 2
+        x, y = position[:, 0], position[:, 1]
+        left = wrap & (x < -radius)
+        right = wrap & ~left & (x > self.screen_size.x + radius)
+        rest = wrap & ~left & ~right
+        top = rest & (y < -radius)
+        bottom = rest & ~top & (y > self.screen_size.y + radius)
+        x[left] += width[left]
+        x[right] -= width[right]
+        y[top] += height[top]
+        y[bottom] -= height[bottom]
+
+    def out_of_bounds(self, objects): #Objetos de la lista que están fuera de la pantalla, igual que GameObject.is_out_of_bounds
+        if not objects:
+            return []
+        rows = np.fromiter((obj._row for obj in objects), dtype=int, count=len(objects))
+        position = self.position[rows]
+        radius = self.radius[rows]
+        outside = (position[:, 0] < -radius) | (position[:, 0] > self.screen_size.x + radius) | \
+                  (position[:, 1] < -radius) | (position[:, 1] > self.screen_size.y + radius)
+        return [objects[i] for i in np.flatnonzero(outside)]
+
+    def pairs(self, position_a, radius_a, position_b, radius_b): #Índices (i, j) de los círculos de a y b que se tocan, ordenados por i y luego por j; mismo cálculo que GameObject.collides_with, por bloques de filas de a
+        if not len(radius_a) or not len(radius_b):
+            return [], []
+        self.checks += len(radius_a) * len(radius_b)
+        step = max(1, self.BLOCK // len(radius_b))
+        hits_a, hits_b = [], []
+        for start in range(0, len(radius_a), step):
+            end = start + step
+            dx = position_b[None, :, 0] - position_a[start:end, None, 0]
+            dy = position_b[None, :, 1] - position_a[start:end, None, 1]
+            i, j = np.nonzero(np.sqrt(dx * dx + dy * dy) < radius_b[None, :] + radius_a[start:end, None])
+            hits_a.extend((i + start).tolist())
+            hits_b.extend(j.tolist())
+        return hits_a, hits_b
+
+class ChannelAllocator: #Reparte los efectos entre un grupo de canales del mixer con prioridades, robo de voces y sin repetir el mismo efecto dos veces en un frame
+    def __init__(self, first_channel, num_channels, priorities, volume=0.1):
+        self._channels = [pygame.mixer.Channel(i) for i in range(first_channel, first_channel + num_channels)]
+        for channel in self._channels:
+            channel.set_volume(volume)
+        self._playing = [None] * num_channels #Prioridad del efecto que suena en cada canal
+        self._priorities = priorities #Diccionario nombre del efecto -> prioridad, a mayor número más importante
+        self._played_this_frame = set()
+        self.played = 0
+        self.stolen = 0 #Voces que han cortado a otra de menor prioridad
+        self.dropped = 0 #Voces descartadas por no quedar canales
+        self.deduplicated = 0 #Voces descartadas por repetirse en el mismo frame
+        self.capped = 0 #Voces descartadas por frame_limit
+        self.frame_limit = None #Efectos por frame como máximo, None sin límite
+        self.frame_played = 0
+        self.frame_dropped = 0
+
+    def new_frame(self): #Se llama una vez al comienzo de cada frame
+        self._played_this_frame.clear()
+        self.frame_played = 0
+        self.frame_dropped = 0
+
+    def _skip(self, name): #Descarta el efecto si ya ha sonado en este frame o si se ha llegado a frame_limit
+        if name in self._played_this_frame:
+            self.deduplicated += 1
+        elif self.frame_limit is not None and self.frame_played >= self.frame_limit:
+            self.capped += 1
+        else:
+            return False
+        self.frame_dropped += 1
+        return True
+
+    def play(self, name):
+        if self._skip(name):
+            return None
+        priority = self._priorities.get(name, 0)
+        index = self._free_channel(priority)
+        if index is None:
+            self.dropped += 1
+            self.frame_dropped += 1
+            return None
+        channel = self._channels[index]
+        channel.play(SOUNDS.get(name))
+        self._playing[index] = priority
+        self._played_this_frame.add(name)
+        self.played += 1
+        self.frame_played += 1
+        return channel
+
+    def _free_channel(self, priority): #Devuelve un canal libre o, si están todos ocupados, el de menor prioridad que no supere a la del nuevo efecto
+        victim = None
+        for index, channel in enumerate(self._channels):
+            if not channel.get_busy():
+                return index
+            if self._playing[index] <= priority and (victim is None or self._playing[index] < self._playing[victim]):
+                victim = index
+        if victim is not None:
+            self.stolen += 1
+        return victim
+
+    def stats(self):
+        return {"played": self.played,
+                "stolen": self.stolen,
+                "dropped": self.dropped,
+                "deduplicated": self.deduplicated,
+                "capped": self.capped,
+                "frame_played": self.frame_played,
+                "frame_dropped": self.frame_dropped,
+                "decode_time": SOUNDS.decode_time}
+
+class SilentChannelAllocator(ChannelAllocator): #Misma interfaz y contadores que ChannelAllocator pero sin tocar el mixer, para el modo headless
+    def __init__(self, priorities):
+        super().__init__(0, 0, priorities)
+
+    def play(self, name):
+        if self._skip(name):
+            return None
+        self._played_this_frame.add(name)
+        self.played += 1
+        self.frame_played += 1
+        return None
+
+
+class Actions: #Acciones del jugador en un frame, guardadas como bits de un entero
+    SHOOT = 1
+    RIGHT = 2
+    LEFT = 4
+    UP = 8
+    DOWN = 16
+    QUIT = 32
+    HOLD_WAVE = 128 #El modo supervivencia retiene la siguiente oleada por carga; no la pulsa el jugador, la decide el LoadGovernor, pero se graba con las acciones para reproducir la partida igual
+    QUICKSAVE = 256 #Comandos fuera del byte de la partida, no se graban en la InputLog
+    QUICKLOAD = 512
+    REWIND = 1024
+    OVERLAY = 2048 #Muestra u oculta el panel de tiempos del FrameProfiler
+    COMMANDS = QUICKSAVE | QUICKLOAD | REWIND | OVERLAY
+
+class KeyboardInput: #Fuente de entrada normal, lee el teclado mediante los eventos de pygame
+    def read(self):
+        actions = 0
+        for event in pygame.event.get():
+            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
+                actions |= Actions.QUIT
+            # shoot when press space
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
+                actions |= Actions.SHOOT
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F3:
+                actions |= Actions.OVERLAY
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F5:
+                actions |= Actions.QUICKSAVE
+            elif event.type == pygame.KEYDOWN and event.key == pygame.K_F9:
+                actions |= Actions.QUICKLOAD
+        is_key_pressed = pygame.key.get_pressed()
+        if is_key_pressed[pygame.K_RIGHT]:
+            actions |= Actions.RIGHT
+        if is_key_pressed[pygame.K_LEFT]:
+            actions |= Actions.LEFT
+        if is_key_pressed[pygame.K_UP]:
+            actions |= Actions.UP
+        if is_key_pressed[pygame.K_DOWN]:
+            actions |= Actions.DOWN
+        if is_key_pressed[pygame.K_BACKSPACE]: #Mientras se mantiene pulsada la partida va hacia atrás
+            actions |= Actions.REWIND
+        return actions
+
+class ScriptedInput: #Fuente de entrada programada: una secuencia de Actions por frame, o una función que recibe el número de frame
+    def __init__(self, actions, loop=False):
+        self._actions = actions
+        self._loop = loop
+        self.frame = 0
+
+    def read(self):
+        frame = self.frame
+        self.frame += 1
+        if callable(self._actions):
+            return self._actions(frame)
+        if self._loop and self._actions:
+            frame %= len(self._actions)
+        return self._actions[frame] if frame < len(self._actions) else 0
+
+class InputLog: #Registro compacto de una partida: la semilla y un byte de Actions por frame, suficiente para reproducirla exactamente
+    MAGIC = b"ASTR"
+    HEADER = struct.Struct("<4sBQI20sIB8s") #magic, versión, semilla, frames, hash del estado final, tamaño del snapshot inicial, modo supervivencia y huella de levels.json
+    VERSION = 3
+
+    def __init__(self, seed, actions=None, final_hash=None, start=None, endless=False, levels=bytes(8)):
+        self.seed = seed
+        self.endless = endless #Modo de la partida grabada, Replay lo aplica
+        self.levels = levels #Huella del fichero de niveles con el que se grabó, ver levels_digest(); ceros en el modo supervivencia
+        self.actions = bytearray(actions or ())
+        self.final_hash = final_hash #Hash hexadecimal del estado al terminar de grabar, None si no se conoce
+        self.start = start #WorldSnapshot desde el que empiezan las acciones, None si empiezan en el frame 0 de la semilla
+        self.first = WorldSnapshot.HEADER.unpack_from(start)[3] if start else 0 #Frame de la primera acción
+        self.replayable = True #False si se ha cargado un estado que no se puede unir a lo grabado
+
+    def __len__(self):
+        return len(self.actions)
+
+    def end(self): #Frame siguiente a la última acción grabada
+        return self.first + len(self.actions)
+
+    def append(self, actions):
+        self.actions.append(actions)
+
+    def truncate(self, frame): #Al rebobinar la grabación sigue desde un frame anterior de la misma partida
+        del self.actions[max(frame - self.first, 0):]
+
+    def save(self, path):
+        if not self.replayable:
+            raise ValueError("la grabación no se puede reproducir: se cargó un estado que no sigue a lo grabado")
+        digest = bytes.fromhex(self.final_hash) if self.final_hash else bytes(20)
+        start = self.start or b""
+        with open(path, "wb") as file:
+            file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self.seed, len(self.actions), digest, len(start), self.endless, self.levels))
+            file.write(zlib.compress(start + bytes(self.actions), 9))
+
+    @classmethod
+    def load(cls, path):
+        with open(path, "rb") as file:
+            data = file.read()
+        magic, version, seed, frames, digest, start_size, endless, levels = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("%s no es una grabación de partida válida" % path)
+        body = zlib.decompress(data[cls.HEADER.size:])
+        start, actions = body[:start_size] or None, body[start_size:]
+        if len(actions) != frames:
+            raise ValueError("%s está incompleta: %d de %d frames" % (path, len(actions), frames))
+        return cls(seed, actions, digest.hex() if any(digest) else None, start, bool(endless), levels)
+
+class Replay: #Reproduce una InputLog en una partida headless por el mismo camino que el juego normal (Asteroids.step), en el modo con el que se grabó
+    def __init__(self, log, entity_store=None):
+        self.log = log
+        settings = {"ENDLESS": log.endless}
+        if entity_store is not None:
+            settings["ENTITY_STORE"] = entity_store
+        self.game = Asteroids(headless=True, seed=log.seed, **settings)
+        if log.levels != self.game.levels_digest:
+            raise ValueError("la grabación se hizo con otro %s" % self.game.LEVELS)
+        if log.start is not None: #Grabación que empieza en un estado cargado
+            self.game.restore(log.start)
+
+    def _begin(self): #La partida vuelve al principio de la grabación
+        self.game.restart(self.log.seed)
+        if self.log.start is not None:
+            self.game.restore(self.log.start)
+
+    def seek(self, frame): #Avanza o retrocede hasta el frame indicado; para retroceder se vuelve a simular desde el principio
+        frame = min(frame, self.log.end())
+        if frame < self.game.frame:
+            self._begin()
+        while self.game.frame < frame and not self.game.is_over():
+            self.game.step(self.log.actions[self.game.frame - self.log.first])
+        return self.game.frame
+
+    def run(self): #Reproduce hasta el final lo más rápido posible, devuelve el tiempo y si el estado final coincide con el grabado
+        start = perf_counter()
+        first = self.game.frame
+        self.seek(self.log.end())
+        elapsed = perf_counter() - start
+        frames = self.game.frame - first
+        state_hash = self.game.state_hash()
+        return {"frames": frames,
+                "seconds": elapsed,
+                "speedup": frames * Asteroids.TIMESTEP / elapsed if elapsed else 0.0,
+                "state_hash": state_hash,
+                "matches": self.log.final_hash is None or self.log.final_hash == state_hash}
+
+class WorldSnapshot: #Estado completo de una partida en un buffer binario: cabecera, estado del generador aleatorio y un registro de tamaño fijo por objeto, en el orden de sus listas
+    MAGIC = b"ASTS"
+    VERSION = 2
+    HEADER = struct.Struct("<4sBQIIHHII16sBHHHHBBB") #magic, versión, semilla, frame, frame del nivel, nivel, siguiente oleada, destruidos, puntuación, fase y número de naves, asteroides, balas, escudos, balas enemigas, boss, vida del boss y modo supervivencia
+    RNG = struct.Struct("<625IBd") #Estado del Mersenne Twister de la partida y la gaussiana pendiente, si la hay
+    SHIP = struct.Struct("<6d2ibB") #posición, velocidad, dirección, vidas, inmunidad, motor y si está fuera de la partida
+    ASTEROID = struct.Struct("<4dB") #posición, velocidad y categoría
+    BULLET = struct.Struct("<4dh") #posición, velocidad e índice de quien la disparó (nave o escudo), -1 si ya no está
+    ESCUDO = struct.Struct("<7d") #posición, velocidad, posición original y recorrido
+    BOSS = struct.Struct("<7diB") #posición, velocidad, llegada, recorrido, vidas y si aún no ha comenzado la batalla
+
+    @classmethod
+    def capture(cls, game): #Se toma entre dos pasos, cuando las listas ya no tienen objetos eliminados
+        ships, escudos, boss = game._ships, game._escudos, game._boss
+        _, state, gauss = game._rng.getstate()
+        parts = [cls.HEADER.pack(cls.MAGIC, cls.VERSION, game.seed, game.frame, game._level_frame, game._level_index, game._next_wave,
+                                 game.destroyed, game._score.score, game._phase.encode(),
+                                 len(ships), len(game._asteroids), len(game._bullets), len(escudos), len(game._bulletsEnemigos),
+                                 boss is not None, game._bossLife is not None, game._survival is not None),
+                 cls.RNG.pack(*state, gauss is not None, gauss or 0.0)]
+        pack = cls.SHIP.pack
+        parts.extend(pack(*ship.position, *ship.velocity, *ship.direction, ship.LIVES, ship.INMUNITY, ship._acceleration, ship._disabled) for ship in ships)
+        pack = cls.ASTEROID.pack
+        parts.extend(pack(*motion, asteroid.CATEGORY) for asteroid, motion in zip(game._asteroids, cls._motion(game, game._asteroids)))
+        pack = cls.BULLET.pack
+        launchers = {id(ship): i for i, ship in enumerate(ships)}
+        parts.extend(pack(*motion, launchers.get(id(bullet.LAUNCHER), -1)) for bullet, motion in zip(game._bullets, cls._motion(game, game._bullets)))
+        parts.extend(cls.ESCUDO.pack(*escudo.position, *escudo.velocity, *escudo.POSICION_ORIGINAL, escudo.PATROL) for escudo in escudos)
+        launchers = {id(escudo): i for i, escudo in enumerate(escudos)}
+        parts.extend(pack(*motion, launchers.get(id(bullet.LAUNCHER), -1)) for bullet, motion in zip(game._bulletsEnemigos, cls._motion(game, game._bulletsEnemigos)))
+        if boss is not None:
+            parts.append(cls.BOSS.pack(*boss.position, *boss.velocity, *boss.ARRIVAL, boss.PATROL, boss.LIVES, boss.fight))
+        if game._survival is not None: #Al final, después del boss
+            state, wave = game._survival.state()
+            parts.append(Survival.STATE.pack(*state))
+            if wave is not None:
+                parts.append(Survival.WAVE.pack(*wave))
+        return b"".join(parts)
+
+    @staticmethod
+    def _motion(game, objects): #(x, y, vx, vy) de cada objeto; con EntityStore se leen todos de los arrays de una vez
+        if game._store is None or not objects:
+            return [(*obj.position, *obj.velocity) for obj in objects]
+        position, velocity, _ = game._store.read(objects)
+        return np.hstack((position, velocity)).tolist()
+
+    @classmethod
+    def restore(cls, game, data): #Sustituye los objetos de la partida por los del snapshot, sacándolos de los pools; las naves y el HUD se reutilizan
+        (magic, version, seed, frame, level_frame, level_index, next_wave, destroyed, score, phase,
+         ships_count, asteroids_count, bullets_count, escudos_count, enemy_count, has_boss, has_boss_life, has_survival) = cls.HEADER.unpack_from(data)
+        if magic != cls.MAGIC or version != cls.VERSION:
+            raise ValueError("no es un snapshot de partida válido")
+        if has_survival != (game._survival is not None):
+            raise ValueError("el snapshot es de otro modo de juego")
+        view = memoryview(data)
+        offset = cls.HEADER.size
+        def records(record, count):
+            nonlocal offset
+            start, offset = offset, offset + record.size * count
+            return record.iter_unpack(view[start:offset])
+        def attach(objects, record, wrap=True): #Añade al EntityStore una lista recién leída; x, y, vx, vy se copian directamente de sus registros en el buffer
+            if game._store is not None:
+                motion = np.ndarray((len(objects), 4), dtype="<f8", buffer=data, offset=offset - record.size * len(objects), strides=(record.size, 8))
+                game._store.attach_all(objects, motion, wrap)
+        rng = next(records(cls.RNG, 1))
+        game._rng.setstate((3, rng[:625], rng[626] if rng[625] else None))
+
+        game._release_all()
+        for pool in game._pools.values():
+            pool.recycle()
+        if game._store is not None: #Almacén nuevo, las filas del anterior pertenecen a objetos ya liberados
+            game._store = game._grid = EntityStore(game.SIZE, max(256, asteroids_count + bullets_count + enemy_count))
+        ships = game._ships
+        for i, (x, y, vx, vy, dx, dy, lives, inmunity, acceleration, disabled) in enumerate(records(cls.SHIP, ships_count)):
+            if i == len(ships):
+                ships.append(StarShip(game.SIZE))
+            ship = ships[i]
+            ship.position, ship.velocity, ship.direction = Vector2(x, y), Vector2(vx, vy), Vector2(dx, dy)
+            ship.LIVES, ship.INMUNITY, ship._acceleration, ship._disabled = lives, inmunity, acceleration, bool(disabled)
+        del ships[ships_count:]
+        pool = game._pools["asteroid"]
+        game._asteroids = [pool.acquire(game.SIZE, game._star_ship, category, position=Vector2(x, y), velocity=Vector2(vx, vy))
+                           for x, y, vx, vy, category in records(cls.ASTEROID, asteroids_count)]
+        attach(game._asteroids, cls.ASTEROID)
+        game._bullets, pool = [], game._pools["bullet"]
+        for x, y, vx, vy, launcher in records(cls.BULLET, bullets_count):
+            bullet = pool.acquire(ships[launcher] if launcher >= 0 else game._star_ship, False)
+            bullet.position, bullet.velocity = Vector2(x, y), Vector2(vx, vy)
+            bullet.LAUNCHER = ships[launcher] if launcher >= 0 else None
+            game._bullets.append(bullet)
+        attach(game._bullets, cls.BULLET, wrap=False)
+        game._escudos, pool = [], game._pools["escudo"]
+        for x, y, vx, vy, original_x, original_y, patrol in records(cls.ESCUDO, escudos_count):
+            escudo = pool.acquire(game.SIZE, position=Vector2(original_x, original_y), velocity=Vector2(vx, vy), patrol=patrol)
+            escudo.position = Vector2(x, y)
+            game._escudos.append(escudo)
+        game._bulletsEnemigos, pool = [], game._pools["enemy_bullet"]
+        for x, y, vx, vy, launcher in records(cls.BULLET, enemy_count):
+            bullet = pool.acquire(game._escudos[launcher] if launcher >= 0 else game._star_ship, True) #Sin escudo, cualquier objeto sirve para crearla porque después se le ponen su posición y velocidad
+            bullet.position, bullet.velocity = Vector2(x, y), Vector2(vx, vy)
+            bullet.LAUNCHER = game._escudos[launcher] if launcher >= 0 else None
+            game._bulletsEnemigos.append(bullet)
+        attach(game._bulletsEnemigos, cls.BULLET, wrap=False)
+        if has_boss:
+            x, y, vx, vy, arrival_x, arrival_y, patrol, lives, fight = next(records(cls.BOSS, 1))
+            if game._boss is None:
+                game._boss = Boss(game.SIZE, Vector2(x, y))
+            boss = game._boss
+            boss.position, boss.velocity, boss.ARRIVAL = Vector2(x, y), Vector2(vx, vy), Vector2(arrival_x, arrival_y)
+            boss.PATROL, boss.LIVES, boss.fight = patrol, lives, bool(fight)
+        else:
+            game._boss = None
+
+        if game._bossLife is not None and not has_boss_life: #El marcador del boss deja de escuchar los eventos de la partida
+            game.events.unsubscribe(Events.BOSS_HIT, game._bossLife.on_hit)
+            game._bossLife = None
+        if has_boss_life:
+            if game._bossLife is None:
+                game._bossLife = BossLife(game.SIZE, game._boss, game.events)
+            game._bossLife.on_hit(game._boss.LIVES)
+        game._playerLife.on_damage(game._star_ship, game._star_ship.LIVES)
+        game._score.set(score)
+        if level_index != game._level_index:
+            game._level_index, game._level = level_index, game._levels[level_index]
+            game._systems = game._build_systems(game._level)
+            if game._level.music is not None and not game.headless:
+                MUSIC.play(game._level.music)
+        phase = phase.rstrip(b"\0").decode()
+        if phase != game._phase:
+            game._set_phase(phase)
+        game.seed, game.frame, game._level_frame, game._next_wave, game.destroyed = seed, frame, level_frame, next_wave, destroyed
+        if has_survival:
+            state = next(records(Survival.STATE, 1))
+            game._survival.set_state(game, state, next(records(Survival.WAVE, 1)) if state[-1] else None)
+        game._dead = 0
+        game._contacts.clear()
+        game._sound_queue.clear()
+        game._renderer.invalidate()
+
+class RewindBuffer: #Historial de los últimos segundos de partida: un WorldSnapshot cada interval frames y, entre uno y otro, solo el byte de Actions de cada frame; cualquier frame intermedio se reconstruye restaurando el snapshot anterior y volviendo a simular
+    MAGIC = b"ASTW"
+    VERSION = 1
+    HEADER = struct.Struct("<4sBIIII") #magic, versión, primer frame, frame actual, acciones y snapshots; para los volcados de errores
+    KEYFRAME = struct.Struct("<II") #frame y tamaño comprimido de cada snapshot del volcado
+
+    def __init__(self, frames, interval, fps):
+        self.frames = frames #Frames de historial que se guardan como mínimo
+        self.interval = interval
+        self.fps = fps
+        self._keyframes = deque() #(frame, cabecera y objetos comprimidos, estado del generador aleatorio)
+        self._inputs = bytearray() #Acciones de cada frame desde el primer snapshot
+        self._first = 0 #Frame del primer snapshot
+        self._silent = None #Los frames que se vuelven a simular al rebobinar no suenan
+
+    def reset(self, game): #Empieza el historial en el estado actual de la partida
+        self._keyframes.clear()
+        self._inputs.clear()
+        self._first = game.frame
+        self._capture(game)
+
+    def push(self, actions): #Acciones del paso que va a simularse
+        self._inputs.append(actions)
+
+    def record(self, game): #Después de cada paso: guarda un snapshot cuando toca y olvida lo que ya queda fuera del historial
+        if game.frame % self.interval:
+            return
+        self._capture(game)
+        keyframes = self._keyframes
+        while len(keyframes) > 1 and keyframes[1][0] <= game.frame - self.frames:
+            keyframes.popleft()
+        del self._inputs[:keyframes[0][0] - self._first]
+        self._first = keyframes[0][0]
+
+    def _capture(self, game):
+        data = game.snapshot()
+        start = WorldSnapshot.HEADER.size
+        end = start + WorldSnapshot.RNG.size
+        rng = data[start:end]
+        keyframes = self._keyframes
+        if keyframes and keyframes[-1][0] == game.frame:
+            keyframes.pop()
+        if keyframes and keyframes[-1][2] == rng: #El generador solo cambia cuando aparecen asteroides, casi siempre se comparte con el snapshot anterior
+            rng = keyframes[-1][2]
+        keyframes.append((game.frame, zlib.compress(data[:start] + data[end:], 1), rng))
+
+    @staticmethod
+    def _snapshot(keyframe):
+        _, body, rng = keyframe
+        body = zlib.decompress(body)
+        return body[:WorldSnapshot.HEADER.size] + rng + body[WorldSnapshot.HEADER.size:]
+
+    def _resimulate(self, game, target): #Restaura el último snapshot anterior a target y vuelve a simular con las acciones guardadas hasta llegar a él
+        keyframes = self._keyframes
+        while len(keyframes) > 1 and keyframes[-1][0] > target:
+            keyframes.pop()
+        frame = keyframes[-1][0]
+        actions = bytes(self._inputs[frame - self._first:target - self._first])
+        del self._inputs[frame - self._first:] #step() las vuelve a añadir
+        game.input_log.truncate(frame)
+        start = perf_counter()
+        WorldSnapshot.restore(game, self._snapshot(keyframes[-1]))
+        game._timed("restore", start)
+        if self._silent is None:
+            self._silent = SilentChannelAllocator(game.SOUND_EFFECTS)
+        sound, game._sound = game._sound, self._silent
+        try:
+            for action in actions:
+                game.step(action)
+        finally:
+            game._sound = sound
+
+    def rewind(self, game, frames): #Retrocede frames pasos, como mucho hasta el principio del historial; devuelve el frame al que se llega
+        self._resimulate(game, max(game.frame - frames, self._first))
+        return game.frame
+
+    def save(self, path, frame): #Vuelca el historial hasta frame; si hay una acción más es la del paso que estaba simulándose
+        with open(path, "wb") as file:
+            file.write(self.HEADER.pack(self.MAGIC, self.VERSION, self._first, frame, len(self._inputs), len(self._keyframes)))
+            for keyframe in self._keyframes:
+                data = zlib.compress(self._snapshot(keyframe), 1)
+                file.write(self.KEYFRAME.pack(keyframe[0], len(data)))
+                file.write(data)
+            file.write(bytes(self._inputs))
+
+    def load(self, data, game): #Carga un volcado y deja la partida en su último frame completo; devuelve la acción del paso que falló, o None
+        magic, version, first, frame, inputs, count = self.HEADER.unpack_from(data)
+        if magic != self.MAGIC or version != self.VERSION:
+            raise ValueError("no es un volcado de historial válido")
+        offset = self.HEADER.size
+        self._keyframes.clear()
+        for _ in range(count):
+            keyframe, size = self.KEYFRAME.unpack_from(data, offset)
+            offset += self.KEYFRAME.size
+            snapshot = zlib.decompress(data[offset:offset + size])
+            offset += size
+            start, end = WorldSnapshot.HEADER.size, WorldSnapshot.HEADER.size + WorldSnapshot.RNG.size
+            self._keyframes.append((keyframe, zlib.compress(snapshot[:start] + snapshot[end:], 1), snapshot[start:end]))
+        self._inputs = bytearray(data[offset:offset + inputs])
+        self._first = first
+        pending = self._inputs[frame - first] if len(self._inputs) > frame - first else None
+        self._resimulate(game, frame)
+        return pending
+
+    def stats(self): #Memoria del historial; los estados del generador compartidos entre snapshots cuentan una vez
+        keyframes = self._keyframes
+        size = sum(len(body) for _, body, _ in keyframes) + sum(len(rng) for rng in {id(rng): rng for _, _, rng in keyframes}.values()) + len(self._inputs)
+        seconds = len(self._inputs) / self.fps
+        return {"keyframes": len(keyframes),
+                "seconds": seconds,
+                "bytes": size,
+                "bytes_per_second": size / seconds if seconds else 0.0}
+
+class FrameProfiler: #Mide cada etapa del frame (entrada, fase, dibujo, flip y espera del reloj) y guarda un historial para el panel en pantalla y para exportar
+    STAGES = ("input", "update", "draw", "flip", "idle")
+    GRAPH_SIZE = (300, 60)
+    GRAPH_SCALE = 2 #Píxeles de altura por milisegundo en la gráfica
+    COLORS = {"input": (90, 200, 250), "update": (250, 200, 60), "draw": (120, 220, 120), "flip": (200, 120, 250), "idle": (70, 70, 70)}
+
+    def __init__(self, history=240):
+        self.frames = deque(maxlen=history) #Últimos frames medidos, cada uno es un diccionario con los tiempos en ms y los contadores
+        self.overlay = False
+        self._font = None
+        self._start = self._lap = 0.0
+        self._current = None
+        self._asset_loads = 0
+        self._capture = 0 #Número de frames más lentos que se guardan con cProfile, 0 si no se está capturando
+        self._worst = [] #Montículo de (tiempo, frame, cProfile.Profile) con los peores frames
+        self._profile = None
+
+    def begin_frame(self):
+        self._current = dict.fromkeys(self.STAGES, 0.0)
+        self._asset_loads = ASSETS.misses
+        if self._capture:
+            self._profile = cProfile.Profile()
+            self._profile.enable()
+        self._start = self._lap = perf_counter()
+
+    def lap(self, stage): #Suma a la etapa el tiempo transcurrido desde la última marca
+        if self._current is None:
+            return
+        now = perf_counter()
+        self._current[stage] += (now - self._lap) * 1000
+        self._lap = now
+
+    def end_frame(self, game):
+        if self._current is None:
+            return
+        record = self._current
+        record["total"] = (perf_counter() - self._start) * 1000
+        record["frame"] = game.frame
+        record["asteroids"] = len(game._asteroids)
+        record["bullets"] = len(game._bullets)
+        record["escudos"] = len(game._escudos)
+        record["bullets_enemigos"] = len(game._bulletsEnemigos)
+        record["collision_checks"] = game._grid.checks
+        record["asset_loads"] = ASSETS.misses - self._asset_loads
+        record["sounds"] = game._sound.frame_played
+        record["dirty_area"] = game._renderer.dirty_area
+        record["draw_calls"] = game._queue.draw_calls
+        record["culled"] = game._queue.culled
+        record["steps"] = game._frame_steps
+        for name, elapsed in game._systems.times.items():
+            record["system_" + name] = elapsed
+        self.frames.append(record)
+        self._current = None
+        if self._profile is not None:
+            self._profile.disable()
+            entry = (record["total"] - record["idle"], record["frame"], self._profile)
+            if len(self._worst) < self._capture:
+                heapq.heappush(self._worst, entry)
+            elif entry[:2] > self._worst[0][:2]:
+                heapq.heapreplace(self._worst, entry)
+            self._profile = None
+
+    def capture_worst(self, count): #Empieza a perfilar cada frame con cProfile y se queda con los count más lentos (sin contar la espera del reloj)
+        self._capture = count
+        self._worst = []
+
+    def dump_worst(self, prefix): #Escribe un .prof por cada frame capturado, del más lento al más rápido
+        paths = []
+        for rank, (total, frame, profile) in enumerate(sorted(self._worst, key=lambda entry: entry[:2], reverse=True)):
+            path = "%s_worst%d_frame%d.prof" % (prefix, rank, frame)
+            profile.dump_stats(path)
+            paths.append(path)
+        return paths
+
+    def export(self, path): #Guarda el historial en JSON o CSV según la extensión del fichero
+        records = list(self.frames)
+        if path.endswith(".csv"):
+            with open(path, "w", newline="") as file:
+                writer = csv.DictWriter(file, fieldnames=list(records[0]) if records else list(self.STAGES))
+                writer.writeheader()
+                writer.writerows(records)
+        else:
+            with open(path, "w") as file:
+                json.dump(records, file, indent=1)
+
+    def draw(self, surface): #Panel con la gráfica de tiempos de los últimos frames, apilando las etapas, y los contadores del último frame
+        if not self.frames:
+            return
+        if self._font is None:
+            self._font = pygame.font.Font(None, 20)
+        width, height = self.GRAPH_SIZE
+        panel = pygame.Surface((width, height + 78), pygame.SRCALPHA)
+        panel.fill((0, 0, 0, 160))
+        budget = height - 1000 / Asteroids.FPS * self.GRAPH_SCALE #Línea del presupuesto de un frame a 60 fps
+        pygame.draw.line(panel, (200, 60, 60), (0, budget), (width, budget))
+        for x, record in enumerate(list(self.frames)[-width:]):
+            y = height
+            for stage in self.STAGES:
+                size = record[stage] * self.GRAPH_SCALE
+                if size >= 1:
+                    pygame.draw.line(panel, self.COLORS[stage], (x, y), (x, max(0, y - size)))
+                y -= size
+        last = self.frames[-1]
+        lines = ["  ".join("%s %.1f" % (stage, last[stage]) for stage in self.STAGES),
+                 "ast %d  bul %d  esc %d  enem %d" % (last["asteroids"], last["bullets"], last["escudos"], last["bullets_enemigos"]),
+                 "checks %d  loads %d  sounds %d" % (last["collision_checks"], last["asset_loads"], last["sounds"]),
+                 "blits %d  culled %d" % (last["draw_calls"], last["culled"])]
+        for i, line in enumerate(lines):
+            panel.blit(self._font.render(line, True, (255, 255, 255)), (4, height + 4 + i * 18))
+        return surface.blit(panel, (surface.get_width() - width - 10, 10))
+
+class Renderer: #Dibujo normal: fondo completo en cada frame y pygame.display.flip()
+    TRACK_RECTS = False #Si necesita los rectángulos dibujados en rects para saber qué actualizar
+
+    def __init__(self):
+        self.rects = [] #Rectángulos dibujados en el frame actual, los devuelven los métodos draw
+        self.frames = 0
+        self.full_frames = 0 #Frames en los que se ha actualizado la pantalla entera
+        self.dirty_area = 0.0 #Fracción de la pantalla actualizada en el último frame
+
+    def begin(self, screen, background):
+        self.rects = []
+        screen.blit(background, (0, 0))
+
+    def present(self):
+        pygame.display.flip()
+        self.frames += 1
+        self.full_frames += 1
+        self.dirty_area = 1.0
+
+    def invalidate(self): #Obliga a redibujar la pantalla entera en el siguiente frame
+        pass
+
+    def stats(self):
+        return {"frames": self.frames, "full_frames": self.full_frames, "dirty_area": self.dirty_area}
+
+class DirtyRectRenderer(Renderer): #Solo restaura el fondo y actualiza en pantalla las zonas donde había o hay algún sprite
+    TRACK_RECTS = True
+
+    def __init__(self, threshold=0.5):
+        super().__init__()
+        self.threshold = threshold #Si la zona sucia supera esta fracción de la pantalla se hace un flip completo
+        self._previous = None #Rectángulos del frame anterior, None para redibujar todo
+        self._screen = None
+
+    def begin(self, screen, background):
+        self._screen = screen
+        if self._previous is None:
+            screen.blit(background, (0, 0))
+        else:
+            for rect in self._previous: #Fuera de estos rectángulos la pantalla ya solo tiene el fondo
+                screen.blit(background, rect, rect)
+        self.rects = []
+
+    def present(self):
+        screen_area = self._screen.get_width() * self._screen.get_height()
+        current = [rect for rect in self.rects if rect]
+        self.frames += 1
+        if self._previous is None:
+            dirty, area = None, screen_area
+        else:
+            dirty = self._previous + current
+            area = sum(rect.width * rect.height for rect in dirty) #Cota superior, los solapes se cuentan dos veces
+        self.dirty_area = min(1.0, area / screen_area)
+        if dirty is None or self.dirty_area > self.threshold:
+            pygame.display.flip()
+            self.full_frames += 1
+        else:
+            pygame.display.update(dirty)
+        self._previous = current
+
+    def invalidate(self):
+        self._previous = None
+
+class RenderQueue: #Comandos de dibujo de un frame: se descarta lo que queda entero fuera de la pantalla, se agrupan por capa y cada capa se dibuja en el orden en que se añadió con una sola llamada a Surface.blits
+    LAYERS = ("asteroids", "effects", "bullets", "hud", "ships", "boss", "boss_hud", "escudos", "enemy_bullets") #Orden de dibujo, de abajo arriba
+
+    def __init__(self, screen_size):
+        self.width, self.height = screen_size
+        self._layers = {layer: [] for layer in self.LAYERS} #capa -> [(sprite, posición)], con los comandos en el formato de blits y en el orden en que se añaden, así los sprites que se solapan quedan igual que dibujándolos uno a uno
+        self._simple = weakref.WeakKeyDictionary() #Versión simplificada de cada sprite, ver simplify(); se olvida cuando el sprite sale de las cachés de TEXTS o ROTATIONS
+        self.far = None #(x, y, distancia): los asteroides a más de esa distancia del punto se dibujan con su sprite simplificado
+        self.queued = 0 #Contadores del último frame
+        self.culled = 0
+        self.simplified = 0
+        self.draw_calls = 0
+
+    def simplify(self, sprite): #El sprite sin transparencia por píxel: color clave negro con RLE, mucho más rápido de dibujar; los bordes semitransparentes quedan oscuros, como el fondo
+        simple = self._simple.get(sprite)
+        if simple is None:
+            simple = pygame.Surface(sprite.get_size())
+            simple.blit(sprite, (0, 0))
+            simple = simple.convert()
+            simple.set_colorkey((0, 0, 0), pygame.RLEACCEL)
+            self._simple[sprite] = simple
+        return simple
+
+    def add(self, layer, sprite, position): #position es la esquina superior izquierda
+        x, y = position
+        width, height = sprite.get_size()
+        if x >= self.width or y >= self.height or x + width <= 0 or y + height <= 0:
+            self.culled += 1
+            return
+        self._layers[layer].append((sprite, (x, y)))
+        self.queued += 1
+
+    def add_objects(self, layer, objects, alpha=1.0, store=None): #Lo mismo que add(layer, *obj.blit_args(alpha)) para cada objeto, sin una llamada ni un Vector2 por objeto; con store las posiciones se leen del EntityStore de una vez
+        commands = self._layers[layer]
+        screen_width, screen_height = self.width, self.height
+        back = 1.0 - alpha if alpha < 1.0 else 0.0
+        culled = 0
+        if self.far is not None and layer == "asteroids":
+            far_x, far_y, distance = self.far
+            distance *= distance
+        else:
+            distance = None
+        if store is not None and objects:
+            position, velocity, radius = store.read(objects)
+            corners = (position - velocity * back - radius[:, None]).tolist()
+        else:
+            corners = None
+        for index, obj in enumerate(objects):
+            sprite = obj.sprite
+            radius = obj.radius
+            if corners is not None:
+                x, y = corners[index]
+            else:
+                position, velocity = obj.position, obj.velocity
+                x = position.x - velocity.x * back - radius
+                y = position.y - velocity.y * back - radius
+            width, height = sprite.get_size()
+            if x >= screen_width or y >= screen_height or x + width <= 0 or y + height <= 0:
+                culled += 1
+                continue
+            if distance is not None and (x + radius - far_x) ** 2 + (y + radius - far_y) ** 2 > distance:
+                sprite = self._simple.get(sprite) or self.simplify(sprite)
+                self.simplified += 1
+            commands.append((sprite, (x, y)))
+        self.culled += culled
+        self.queued += len(objects) - culled
+
+    def submit(self, surface, rects=None): #Dibuja y vacía la cola; si se pasa rects se le añaden los rectángulos dibujados
+        self.draw_calls = 0
+        for layer in self.LAYERS:
+            commands = self._layers[layer]
+            if not commands:
+                continue
+            if rects is not None:
+                rects.extend(surface.blits(commands))
+            else:
+                surface.blits(commands, doreturn=False)
+            self.draw_calls += 1
+            commands.clear()
+
+    def begin(self):
+        self.queued = self.culled = self.simplified = 0
+
+    def stats(self):
+        return {"queued": self.queued, "culled": self.culled, "simplified": self.simplified, "draw_calls": self.draw_calls}
+
+class Wave: #Oleada ya compilada: cuándo aparece y la categoría de cada asteroide
+    def __init__(self, at, categories):
+        self.at = at #"start", "cleared" (cuando no quedan asteroides) o número de frame dentro del nivel
+        self.categories = categories
+
+    def triggered(self, frame, asteroids):
+        if self.at == "start":
+            return True
+        if self.at == "cleared":
+            return not asteroids
+        return frame >= self.at
+
+class Level: #Nivel leído de levels.json: qué fase lo ejecuta y qué aparece en él
+    PHASES = ("phase1", "phase2", "boss_phase")
+
+    def __init__(self, name, phase, waves=(), music=None, boss=None, escudos=()):
+        self.name = name
+        self.phase = phase #Tipo de nivel, decide los sistemas que se ejecutan (ver Asteroids._build_systems)
+        self.waves = waves
+        self.music = music
+        self.boss = boss #Diccionario con spawn, arrival, patrol y lives, solo en boss_phase
+        self.escudos = escudos
+
+def _check(condition, path, where, message):
+    if not condition:
+        raise ValueError("%s: %s: %s" % (path, where, message))
+
+def _point(value, path, where):
+    _check(isinstance(value, list) and len(value) == 2 and all(isinstance(v, (int, float)) for v in value), path, where, "se esperaba [x, y]")
+    return Vector2(value)
+
+def _waypoint(value, path, where): #Punto al que el boss o un escudo tiene que llegar exactamente: se mueven 0.5 o 1 píxel por paso y comparan la posición con ==
+    point = _point(value, path, where)
+    _check((point.x * 2).is_integer() and (point.y * 2).is_integer(), path, where, "las coordenadas deben ser múltiplos de 0.5, si no el boss o los escudos nunca llegan a ellas")
+    return point
+
+def load_levels(path): #Lee y valida el fichero de niveles una sola vez, dejando las oleadas listas para usarse sin más cálculos durante la partida
+    with open(path, encoding="utf-8") as file:
+        data = json.load(file)
+    _check(isinstance(data, dict) and isinstance(data.get("levels"), list) and data["levels"], path, "levels", "se esperaba una lista de niveles no vacía")
+    levels = []
+    for index, entry in enumerate(data["levels"]):
+        where = "levels[%d]" % index
+        _check(isinstance(entry, dict), path, where, "se esperaba un objeto")
+        phase = entry.get("phase")
+        _check(phase in Level.PHASES, path, where, "phase debe ser uno de %s" % ", ".join(Level.PHASES))
+        music = entry.get("music")
+        _check(music is None or isinstance(music, str), path, where, "music debe ser una ruta")
+        name = entry.get("name", "%s %d" % (phase, index + 1))
+        if phase == "boss_phase":
+            boss = entry.get("boss")
+            _check(isinstance(boss, dict), path, where, "falta boss")
+            _check(isinstance(boss.get("patrol"), (int, float)) and boss["patrol"] > 0 and float(boss["patrol"]).is_integer(), path, where + ".boss",
+                   "patrol debe ser un número entero positivo, los escudos y el boss patrullan a 1 píxel por paso")
+            _check(isinstance(boss.get("lives"), int) and boss["lives"] > 0, path, where + ".boss", "lives debe ser un entero positivo")
+            escudos = entry.get("escudos", [])
+            _check(isinstance(escudos, list), path, where, "escudos debe ser una lista de posiciones")
+            spawn = _waypoint(boss.get("spawn"), path, where + ".boss.spawn")
+            arrival = _waypoint(boss.get("arrival"), path, where + ".boss.arrival")
+            _check(spawn.x == arrival.x and spawn.y <= arrival.y, path, where + ".boss",
+                   "arrival debe estar en la vertical de spawn y por debajo, el boss entra bajando 0.5 píxeles por paso")
+            levels.append(Level(name, phase, music=music,
+                                boss={"spawn": spawn,
+                                      "arrival": arrival,
+                                      "patrol": boss["patrol"],
+                                      "lives": boss["lives"]},
+                                escudos=tuple(_waypoint(p, path, "%s.escudos[%d]" % (where, i)) for i, p in enumerate(escudos))))
+            continue
+        waves = entry.get("waves")
+        _check(isinstance(waves, list) and waves, path, where, "se esperaba una lista de oleadas no vacía")
+        compiled = []
+        for number, wave in enumerate(waves):
+            wave_where = "%s.waves[%d]" % (where, number)
+            _check(isinstance(wave, dict), path, wave_where, "se esperaba un objeto")
+            at = wave.get("at", "start")
+            _check(at in ("start", "cleared") or (isinstance(at, int) and at >= 0), path, wave_where, "at debe ser start, cleared o un frame")
+            groups = wave.get("asteroids")
+            _check(isinstance(groups, list) and groups, path, wave_where, "se esperaba una lista de asteroides no vacía")
+            categories = []
+            for group in groups:
+                _check(isinstance(group, dict) and group.get("category") in (1, 2, 3), path, wave_where, "category debe ser 1, 2 o 3")
+                _check(isinstance(group.get("count"), int) and group["count"] > 0, path, wave_where, "count debe ser un entero positivo")
+                categories.extend([group["category"]] * group["count"])
+            compiled.append(Wave(at, tuple(categories)))
+        levels.append(Level(name, phase, tuple(compiled), music=music))
+    return levels
+
+def levels_digest(path): #Huella del fichero de niveles; una grabación solo se reproduce igual con los mismos niveles
+    with open(path, "rb") as file:
+        return hashlib.sha1(file.read()).digest()[:8]
+
+class Events: #Eventos de la partida que se publican en el EventBus
+    DAMAGE_TAKEN = "damage_taken" #ship: nave dañada, lives: vidas que le quedan
+    BOSS_HIT = "boss_hit" #lives: vidas que le quedan al boss
+    ASTEROID_DESTROYED = "asteroid_destroyed" #category: categoría del asteroide, position: dónde estaba
+    SHIELD_DESTROYED = "shield_destroyed"
+    PHASE_CHANGE = "phase_change" #phase: nueva fase (la de un nivel, game_over o victory)
+
+class EventBus: #Reparte los eventos de la partida entre quien se haya suscrito, en el momento en que se publican
+    def __init__(self):
+        self._handlers = {}
+        self.published = {} #Número de veces que se ha publicado cada evento
 
+    def subscribe(self, event, handler): #handler recibe los datos del evento como argumentos con nombre
+        self._handlers.setdefault(event, []).append(handler)
+
+    def unsubscribe(self, event, handler):
+        self._handlers[event].remove(handler)
+
+    def publish(self, event, **data):
+        self.published[event] = self.published.get(event, 0) + 1
+        for handler in self._handlers.get(event, ()):
+            handler(**data)
+
+class TextCache: #Guarda el texto ya renderizado por (fuente, texto, color), así un texto que no cambia no se vuelve a renderizar
+    def __init__(self, max_entries=64):
+        self.max_entries = max_entries
+        self._surfaces = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def render(self, font, text, color):
+        key = (font, text, tuple(color))
+        surface = self._surfaces.get(key)
+        if surface is not None:
+            self.hits += 1
+            self._surfaces.move_to_end(key)
+            return surface
+        self.misses += 1
+        surface = font.render(text, True, color)
+        self._surfaces[key] = surface
+        if len(self._surfaces) > self.max_entries:
+            self._surfaces.popitem(last=False)
+        return surface
+
+    def stats(self):
+        return {"hits": self.hits, "misses": self.misses, "cached": len(self._surfaces)}
+
+TEXTS = TextCache() #Textos renderizados compartidos por todo el juego
 
 def print_text(surface, text, font, color=pygame.Color("tomato")): #Esta función se encarga de mostrar Game Over o Victory al final de la partida
-    text_surface = font.render(text, True, color)
+    text_surface = TEXTS.render(font, text, color)
     rect = text_surface.get_rect()
     rect.center = Vector2(surface.get_size()) / 2
     surface.blit(text_surface, rect)
 
 
 class GameObject: #Clase padre para el resto de clases para el juego
+    __slots__ = ("screen_size", "position", "sprite", "radius", "velocity", "_disabled", "uid", "__weakref__") #Las subclases sin __slots__ siguen teniendo __dict__
+    _uids = count(1)
+
     def __init__(self, screen_size, position, sprite, velocity): #Constructor de la clase
+        self.uid = next(self._uids) #Identificador único del objeto, también cuando se reutiliza desde un pool; lo usan los snapshots de red
         self.screen_size = screen_size
         self.position = Vector2(position)
         self.sprite = sprite
@@ -33,31 +1354,37 @@ class GameObject: #Clase padre para el resto de clases para el juego
         self.velocity = velocity
         self._disabled = False
 
-    def draw(self, surface): #Se encarga de mostrar pintar en pantalla el sprite del objeto
-        blit_position = self.position - Vector2(self.radius)  # (radius, radius)
-        surface.blit(self.sprite, blit_position)
+    def render_position(self, alpha=1.0): #Posición interpolada entre el paso anterior (alpha=0) y el actual (alpha=1); en cada paso la posición avanza exactamente velocity, así que no hace falta guardar la anterior
+        if alpha >= 1.0:
+            return self.position
+        return self.position - self.velocity * (1.0 - alpha)
+
+    def blit_args(self, alpha=1.0): #Sprite y esquina superior izquierda donde se dibuja
+        position = self.render_position(alpha)
+        return self.sprite, (position.x - self.radius, position.y - self.radius)
+
+    def draw(self, surface, alpha=1.0): #Se encarga de mostrar pintar en pantalla el sprite del objeto
+        return surface.blit(*self.blit_args(alpha)) #Devuelve el rectángulo de pantalla modificado
 
     def update(self): #Se encarga de actualizar la posición del objeto en cuestión
-        if type(self) == Boss: #En caso de que la clase que esté usando el método sea Boss
-            if self.position == Vector2(512,200) and self.fight: #Cuando llegue a la posición indicada su velocidad cambia y comienza la batalla
-                self.velocity = Vector2(-1,0)
-                self.fight = False
-            if self.position == Vector2(512,200) - Vector2(312,0)  or self.position == Vector2(512,200) + Vector2(312,0):
-                self.velocity = self.velocity * -1
-        if type(self) == Escudos: #En caso de que la clase que esté usando el método sea Escudos, invertirá la velocidad al llegar al final de la pantalla
-            if self.position == self.POSICION_ORIGINAL - Vector2(312,0) or self.position == self.POSICION_ORIGINAL + Vector2(312,0):
-                self.velocity = self.velocity * -1
-        self.position = self.position + self.velocity #Genera el movimiento del objeto en pantalla, actualizando la posicion mediante la velocidad
-        #Esta cadena de condicionales gestiona los objetos cuando salen de la pantalla 
-        if self.position.x < -self.radius:
-            self.position.x += self.screen_size.x + self.radius * 2
-        elif self.position.x > self.screen_size.x + self.radius:
-            self.position.x -= self.screen_size.x + self.radius * 2
-        elif self.position.y < -self.radius:
-            self.position.y += self.screen_size.y + self.radius * 2
-        elif self.position.y > self.screen_size.y + self.radius:
-            self.position.y -= self.screen_size.y + self.radius * 2
-        
+        self.move()
+        self.wrap()
+
+    def move(self): #Genera el movimiento del objeto en pantalla, actualizando la posicion mediante la velocidad; las subclases añaden aquí su propio comportamiento
+        self.position = self.position + self.velocity
+
+    def wrap(self): #Esta cadena de condicionales gestiona los objetos cuando salen de la pantalla 
+        position = self.position
+        if position.x < -self.radius:
+            position.x += self.screen_size.x + self.radius * 2
+        elif position.x > self.screen_size.x + self.radius:
+            position.x -= self.screen_size.x + self.radius * 2
+        elif position.y < -self.radius:
+            position.y += self.screen_size.y + self.radius * 2
+        elif position.y > self.screen_size.y + self.radius:
+            position.y -= self.screen_size.y + self.radius * 2
+        self.position = position
+
 
     def collides_with(self, other_obj): #Comprueba si un objeto está colisionando con otro
         distance = self.position.distance_to(other_obj.position)
@@ -74,15 +1401,49 @@ class GameObject: #Clase padre para el resto de clases para el juego
         return self.position.x < -self.radius or self.position.x > self.screen_size.x + self.radius or \
             self.position.y < -self.radius or self.position.y > self.screen_size.y + self.radius
 
+class StoreView(GameObject): #Posición y velocidad de un objeto que pueden vivir en una fila de EntityStore; sin almacén se comportan como atributos normales
+    __slots__ = ("_store", "_row", "_pool", "_position", "_velocity")
+
+    def __init__(self, *args, **kwargs):
+        self._store = None
+        self._row = None
+        self._pool = None #ObjectPool del que se ha sacado el objeto, si lo hay
+        super().__init__(*args, **kwargs)
+
+    @property
+    def position(self):
+        if self._store is None:
+            return self._position
+        return Vector2(*self._store.position[self._row])
+
+    @position.setter
+    def position(self, value):
+        if self._store is None:
+            self._position = value
+        else:
+            self._store.position[self._row] = value
+
+    @property
+    def velocity(self):
+        if self._store is None:
+            return self._velocity
+        return Vector2(*self._store.velocity[self._row])
+
+    @velocity.setter
+    def velocity(self, value):
+        if self._store is None:
+            self._velocity = value
+        else:
+            self._store.velocity[self._row] = value
+
 '''***************************************************************************
    *****                    TIPOS DE ASTEROIDE                          ******
    ***************************************************************************'''
-class Asteroid(GameObject):
+class Asteroid(StoreView):
+    __slots__ = ("CATEGORY", "SPRITE")
     SPEEDS = [-2, -1.5, -1, 0.5, 0.5, 1, 1.5, 2]
     MIN_DISTANCE = 20
-    SPRITE = None
-    CATEGORY = None
-    def __init__(self, screen_size, star_ship, category, position=None, velocity=None):
+    def __init__(self, screen_size, star_ship, category, position=None, velocity=None, rng=random): #rng es el generador aleatorio de la partida, para poder reproducirla
         self.CATEGORY = category
         if category == 1:
             self.SPRITE = load_image("asteroid.v2") #Asteroide Grande
@@ -91,14 +1452,14 @@ class Asteroid(GameObject):
         elif category == 3:
             self.SPRITE = load_image("asteroid.v4") #Asteroide Pequeño
         while position is None:
-            position = Vector2(randrange(0, screen_size.x), randrange(0, screen_size.y))
+            position = Vector2(rng.randrange(0, int(screen_size.x)), rng.randrange(0, int(screen_size.y)))
             if position.distance_to(star_ship.position) < star_ship.radius * self.MIN_DISTANCE:
                 position = None
         super().__init__(screen_size, #Llama al constructor de la clase padre
                          position,
                          self.SPRITE,
                          velocity if velocity is not None
-                         else Vector2(choice(self.SPEEDS), choice(self.SPEEDS)))
+                         else Vector2(rng.choice(self.SPEEDS), rng.choice(self.SPEEDS)))
 
 '''****************************************************************
    *****                    JUGADOR                          ******
@@ -115,10 +1476,11 @@ class StarShip(GameObject): #Nave del Jugador
                "inmunity brake": "invulnerable1", #Sprite motor delantero mientras es inmune
                "inmunity": "invulnerable"} #Sprite mientras es inmune
     INMUNITY = 0 #Este atributo indica si la nave está siendo inmune o no, mientras sea 0 significa que la nave puede recibir daño, en caso contrario no
+    INMUNITY_TIME = 2.0 #Segundos que dura la inmunidad después de recibir daño
 
-    def __init__(self, screen_size): #Se llama al constructor de la clase Padre
+    def __init__(self, screen_size, position=None): #Se llama al constructor de la clase Padre
         super().__init__(screen_size,
-                         screen_size // 2,
+                         position if position is not None else screen_size // 2,
                          load_image(self.SPRITES.get("normal")),
                          Vector2(0))
         self.direction = Vector2(0, -1)
@@ -129,11 +1491,23 @@ class StarShip(GameObject): #Nave del Jugador
         self._inmunity = load_image(self.SPRITES.get("inmunity"))
         self._acceleration = 0
 
+    def hit(self, events): #Recibe daño si no es inmune: pierde una vida y comienza su inmunidad
+        if self.INMUNITY != 0 or self.LIVES == 0:
+            return
+        self.LIVES -= 1
+        self.INMUNITY = 1
+        if self.LIVES == 0:
+            self.disable()
+        events.publish(Events.DAMAGE_TAKEN, ship=self, lives=self.LIVES)
+
     def rotate(self, clockwise=False): #Permite girar la nave del jugador
         sign = 1 if clockwise else -1
         angle = self.MANEUVERABILITY * sign
         self.direction.rotate_ip(angle)
 
+    def release(self): #Al comenzar cada paso los motores se apagan, solo se encienden si se pulsa la tecla en ese paso
+        self._acceleration = 0
+
     def thrust(self, brake=False): #Este método hace que la nave a diferencia del resto de objetos se mueva por propulsión
         self._acceleration = -1 if brake else 1
         self.velocity += self.direction * self.FORCE * self._acceleration
@@ -142,7 +1516,7 @@ class StarShip(GameObject): #Nave del Jugador
         if abs(self.velocity.y) >= self.SPEED_LIMIT:
             self.velocity.y = copysign(1, self.velocity.y) * self.SPEED_LIMIT
 
-    def draw(self, surface): #Se hace override del método de la lase padre para añadir las rotaciones, y los cambios de sprite según la situación de la nave
+    def blit_args(self, alpha=1.0): #Se hace override del método de la lase padre para añadir las rotaciones, y los cambios de sprite según la situación de la nave
         real_sprite = self.sprite
         if self.INMUNITY > 0:
             real_sprite = self._inmunity
@@ -155,16 +1529,15 @@ class StarShip(GameObject): #Nave del Jugador
         if self._acceleration > 0 and self.INMUNITY == 0:
             real_sprite = self._thrust_sprite
         angle = self.direction.angle_to(Vector2(0, -1))
-        rotated_surface = rotozoom(real_sprite, angle, 1.0)
+        rotated_surface = ROTATIONS.get(real_sprite, angle) #El giro siempre avanza de MANEUVERABILITY en MANEUVERABILITY grados, así que el atlas cubre todos los ángulos posibles
         rotated_surface_size = Vector2(rotated_surface.get_size())
-        blit_position = self.position - rotated_surface_size * 0.5
-        surface.blit(rotated_surface, blit_position)
-        self._acceleration = 0
+        blit_position = self.render_position(alpha) - rotated_surface_size * 0.5
+        return rotated_surface, tuple(blit_position)
 
-class Bullet(GameObject): #Bala disparada por el jugador
+class Bullet(StoreView): #Bala disparada por el jugador
+    __slots__ = ("LAUNCHER",)
     PLAYER_BULLET_SPEED = 6
     ENEMY_BULLET_SPEED = 3
-    LAUNCHER = None
     def __init__(self, launcher, enemy: bool):
         self.LAUNCHER = launcher #El parámetro launcher debe ser o bien un objeto StarShip o bien un objeto Escudos, ya que son los únicos que disparan
         if not enemy: #El parámetro enemy indicará si la bala será disparada por el jugador, o los enemigos
@@ -179,7 +1552,7 @@ class Bullet(GameObject): #Bala disparada por el jugador
                          Vector2(0,1) * self.ENEMY_BULLET_SPEED)
 
     def update(self): #Se hace override a este metodo para que la bala se elimine al salir de la pantalla, es decir no se gestione como el resto de objetos
-        self.position = self.position + self.velocity
+        self.move()
 
     def is_disabled(self):
         return self._disabled or self.is_out_of_bounds()
@@ -191,48 +1564,72 @@ class PlayerLifes(GameObject): #Vidas del Jugador
                0 : "PlayerLife0"
                }
     player: StarShip #Este atributo almacena la nave creada en la partida para tener acceso a sus atributos, principalmente al atributo INMUNITY y al atributo LIVES
-    def __init__(self, screen_size, player):
+    def __init__(self, screen_size, player, events):
         self.player = player
+        self._sprites = {lives: load_image(name) for lives, name in self.SPRITES.items()} #Todos los sprites se cargan al crearse, después solo se cambia de uno a otro
         super().__init__(screen_size,
                           Vector2(70,80),
-                         load_image(self.SPRITES.get(3)),
+                         self._sprites[min(player.LIVES, 3)],
                          Vector2(0))
-    def update(self): #Se hace override al método de la clase padre *update* para adaptarla al objeto
-        if self.player.LIVES == 2: 
-            self.sprite = load_image(self.SPRITES.get(2))
-        if self.player.LIVES == 1:
-           self.sprite = load_image(self.SPRITES.get(1))
-        if self.player.LIVES == 0:
-           self.sprite = load_image(self.SPRITES.get(0))
+        events.subscribe(Events.DAMAGE_TAKEN, self.on_damage) #El sprite solo cambia cuando la nave pierde una vida
+
+    def on_damage(self, ship, lives):
+        if ship is self.player: #En partidas con varios jugadores solo cuenta la nave de este marcador
+            self.sprite = self._sprites[min(lives, 3)]
 
 '''************************************************************
    ********            FINAL BOSS                   ***********
    ************************************************************'''
 
-class Escudos(GameObject): #Escudos del Boss
-    POSICION_ORIGINAL = None #Guarda la primera posición del objeto
-    IDENTIFICADOR = 4 #Esta variable identificador será usada más tarde para crear un canal por cada disparo de estos objetos, de esta manera se evita el solapamiento del sonido
-    def __init__(self, screen_size, position, velocity=None):
-        self.IDENTIFICADOR+=1
-        if self.IDENTIFICADOR ==20: #Cuando llega a 20 se resetea para no crear canales infinitos sino reutilizar los que ya han reproducido el sonido y por lo tanto se pueden reutilizar
-            self.IDENTIFICADOR=4
+class Escudos(StoreView): #Escudos del Boss
+    __slots__ = ("POSICION_ORIGINAL", "PATROL") #Primera posición del objeto y distancia que recorre a cada lado de ella
+    def __init__(self, screen_size, position, velocity=None, patrol=312):
         self.POSICION_ORIGINAL = position
+        self.PATROL = patrol
         super().__init__(screen_size,
                          position,
                          load_image("escudopng"),
                          velocity if velocity is not None
                          else Vector2(-1, 0))
 
+    def move(self): #Invierte la velocidad al llegar al final de su recorrido
+        if self.position == self.POSICION_ORIGINAL - Vector2(self.PATROL,0) or self.position == self.POSICION_ORIGINAL + Vector2(self.PATROL,0):
+            self.velocity = self.velocity * -1
+        super().move()
+
 class Boss(GameObject): #Boss Final
     LIVES = 6
     fight = True #Este atributo lo usaremos para saber si ya ha comenzado la batalla y por tanto ya puede recibir daño el boss
-    def __init__(self, screen_size, position, velocity=None):
+    ARRIVAL = Vector2(512,200) #Posición en la que se detiene para comenzar la batalla
+    PATROL = 312 #Distancia que recorre a cada lado de ARRIVAL durante la batalla
+    def __init__(self, screen_size, position, velocity=None, arrival=None, patrol=None, lives=None):
+        if arrival is not None:
+            self.ARRIVAL = Vector2(arrival)
+        if patrol is not None:
+            self.PATROL = patrol
+        if lives is not None:
+            self.LIVES = lives
         super().__init__(screen_size,
                          position,
                          load_image("Boss"),
                          velocity if velocity is not None
                          else Vector2(0, 0.5))
 
+    def move(self):
+        if self.position == self.ARRIVAL and self.fight: #Cuando llegue a la posición indicada su velocidad cambia y comienza la batalla
+            self.velocity = Vector2(-1,0)
+            self.fight = False
+        if self.position == self.ARRIVAL - Vector2(self.PATROL,0)  or self.position == self.ARRIVAL + Vector2(self.PATROL,0):
+            self.velocity = self.velocity * -1
+        super().move()
+
+    def hit(self, events): #Para que el boss pueda ser dañado debe haber llegado a su posición.y fija, de esta manera se evita que el jugador lo pueda matar antes de que salgan sus escudos; devuelve si ha recibido el golpe
+        if self.position.y != self.ARRIVAL.y or self.LIVES == 0:
+            return False
+        self.LIVES -= 1
+        events.publish(Events.BOSS_HIT, lives=self.LIVES)
+        return True
+
 class BossLife(GameObject): #Mismo funcionamiento que la clase PlayerLifes
     SPRITES = {6 : "BossLife6",
                5 : "BossLife5",
@@ -244,329 +1641,1071 @@ class BossLife(GameObject): #Mismo funcionamiento que la clase PlayerLifes
                }
     boss:Boss
     
-    def __init__(self, screen_size, boss):
+    def __init__(self, screen_size, boss, events):
         self.boss = boss
+        self._sprites = {lives: load_image(name) for lives, name in self.SPRITES.items()}
         super().__init__(screen_size,
                           Vector2(512,650),
-                         load_image(self.SPRITES.get(6)),
+                         self._sprites[min(boss.LIVES, 6)],
                          Vector2(0))
+        events.subscribe(Events.BOSS_HIT, self.on_hit)
+
+    def on_hit(self, lives):
+        self.sprite = self._sprites[min(lives, 6)]
+
+class ScoreText: #Puntuación de la partida; el texto solo se vuelve a renderizar cuando cambia
+    POINTS = {1: 20, 2: 50, 3: 100} #Puntos por asteroide según su categoría, los pequeños valen más
+    SHIELD_POINTS = 50
+    BOSS_POINTS = 200 #Por cada vida que pierde el boss
+    COLOR = pygame.Color("white")
+
+    def __init__(self, position, font, events):
+        self.position = position #Esquina superior derecha del texto
+        self.font = font
+        self.score = 0
+        self.sprite = TEXTS.render(font, "0", self.COLOR)
+        events.subscribe(Events.ASTEROID_DESTROYED, lambda category, position: self.add(self.POINTS[category]))
+        events.subscribe(Events.SHIELD_DESTROYED, lambda: self.add(self.SHIELD_POINTS))
+        events.subscribe(Events.BOSS_HIT, lambda lives: self.add(self.BOSS_POINTS))
+
+    def add(self, points):
+        self.set(self.score + points)
+
+    def set(self, score):
+        self.score = score
+        self.sprite = TEXTS.render(self.font, str(self.score), self.COLOR)
+
+    def blit_args(self):
+        return self.sprite, self.sprite.get_rect(topright=self.position).topleft
+
+    def draw(self, surface):
+        return surface.blit(*self.blit_args())
+
+''' ******************************************************
+    ********            SUPERVIVENCIA             ********
+    ******************************************************'''
+class Spark(GameObject): #Chispa de una explosión en el modo supervivencia; es solo decorativa, no choca con nada ni forma parte del estado de la partida
+    LIFE = 20 #Pasos que dura
+    SPEED = 2
+
+    def __init__(self, screen_size, position, direction):
+        super().__init__(screen_size, position, load_image("bullet"), direction * self.SPEED)
+        self.life = self.LIFE
+
+class LoadGovernor: #Vigila el tiempo de trabajo de cada frame (sin contar la espera del reloj) y sube o baja el nivel de recorte con histéresis
+    SOUNDS, FAR_SPRITES, EFFECTS, SPAWNS = 1, 2, 3, 4 #Cada nivel añade su recorte a los de los niveles anteriores
+    NAMES = ("none", "sounds", "far_sprites", "effects", "spawns")
+
+    def __init__(self, budget_ms, high=0.65, low=0.4, smoothing=0.1, up_frames=30, down_frames=180):
+        self.budget_ms = budget_ms #Tiempo de un frame a la frecuencia de la simulación
+        self.high = high #Fracción del presupuesto a partir de la cual se recorta más, con margen para los picos
+        self.low = low #Fracción por debajo de la cual se recorta menos
+        self.smoothing = smoothing
+        self.up_frames = up_frames #Frames como mínimo entre dos cambios de nivel, subir es más rápido que bajar
+        self.down_frames = down_frames
+        self.level = 0
+        self.average_ms = 0.0 #Media exponencial del tiempo de trabajo por frame
+        self._since = 0 #Frames desde el último cambio de nivel
+
+    def observe(self, work_ms):
+        self.average_ms += (work_ms - self.average_ms) * self.smoothing
+        self._since += 1
+        if self.average_ms > self.budget_ms * self.high and self.level < self.SPAWNS and self._since >= self.up_frames:
+            self.level += 1
+            self._since = 0
+        elif self.average_ms < self.budget_ms * self.low and self.level > 0 and self._since >= self.down_frames:
+            self.level -= 1
+            self._since = 0
+
+class Survival: #Modo supervivencia sin fin: oleadas de asteroides cada vez mayores y recorte de carga según el tiempo de cada frame, con telemetría por oleada
+    FIRST_WAVE = 6 #Asteroides de la primera oleada
+    GROWTH = 4 #Asteroides más en cada oleada siguiente
+    CATEGORIES = (1, 1, 2, 3) #Categorías entre las que se elige cada asteroide, los grandes salen el doble
+    WAVE_TIME = 20 #Segundos tras los que llega la siguiente oleada aunque queden asteroides
+    SOUND_CAP = 1 #Efectos por frame al recortar sonidos, se queda el de más prioridad
+    FAR_DISTANCE = 350 #Píxeles a partir de los cuales un asteroide se dibuja simplificado al recortar sprites
+    SPARKS = 4 #Chispas por asteroide destruido
+    MAX_SPARKS = 160
+    FRAME_MS_BIN = 0.25 #Ancho en ms de cada barra del histograma de tiempos de frame de una oleada; la última recoge también todo lo que pasa de ella
+    FRAME_MS_BINS = 128
+    WAVE_FIELDS = ("wave", "asteroids", "frame", "steps", "frames", "frame_ms_total", "frame_ms_max", "max_shedding",
+                   "shedding_frames", "throttled_frames", "sounds_capped", "sprites_simplified", "sparks_dropped", "peak_entities") #Contadores de la oleada en curso, en el orden de WAVE
+    STATE = struct.Struct("<BdIB") #Para WorldSnapshot: nivel, media y frames desde el último cambio del LoadGovernor y si hay una oleada en curso
+    WAVE = struct.Struct("<5I2dB6I%dI" % FRAME_MS_BINS) #WAVE_FIELDS y el histograma de tiempos de la oleada en curso
+
+    def __init__(self, game):
+        self.governor = LoadGovernor(1000 / game.FPS)
+        self.effects = [] #Chispas en pantalla
+        self.telemetry = [] #Un diccionario por oleada terminada
+        self.waves = 0 #Oleadas que han aparecido
+        self.hold = False #Si en este paso se retiene la siguiente oleada, viene de Actions.HOLD_WAVE
+        self._pool = ObjectPool(Spark)
+        self._screen_size = game.SIZE
+        self._wave = None #Contadores de la oleada actual
+        self._capped = game._sound.capped #Sonidos recortados ya contados en la telemetría
+        self._logged = 0 #Última oleada escrita en el fichero de telemetría; al rebobinar una oleada puede terminar dos veces, pero solo se escribe la primera
+        game.events.subscribe(Events.ASTEROID_DESTROYED, self.on_destroyed)
+
+    def spawn(self, game): #Lo ejecuta SurvivalSystem al comienzo de cada paso: la oleada siguiente llega al limpiar la pantalla o al pasar WAVE_TIME
+        shedding = self.governor.level
+        game._sound.frame_limit = self.SOUND_CAP if shedding >= LoadGovernor.SOUNDS else None
+        if game._next_wave: #Hay una oleada en curso
+            if game._asteroids:
+                if game._level_frame < self.WAVE_TIME * game.FPS:
+                    return
+                if self.hold: #Con demasiada carga la oleada espera a que se limpie la pantalla
+                    if self._wave is not None:
+                        self._wave["throttled_frames"] += 1
+                    return
+            self.finish(game)
+        game._next_wave += 1 #Número de oleada y frames desde que empezó, así se guardan en los snapshots como los de un nivel normal
+        game._level_frame = 0
+        self.waves = game._next_wave
+        size = self.wave_size(self.waves)
+        self._wave = {"seed": game.seed, "wave": game._next_wave, "asteroids": size, "frame": game.frame, "steps": 0, "frames": 0,
+                      "frame_ms_total": 0.0, "frame_ms_max": 0.0, "max_shedding": shedding, "shedding_frames": 0, "throttled_frames": 0,
+                      "sounds_capped": 0, "sprites_simplified": 0, "sparks_dropped": 0, "peak_entities": 0,
+                      "frame_ms_bins": [0] * self.FRAME_MS_BINS}
+        for _ in range(size):
+            game._spawn(game._asteroids, game._pools["asteroid"].acquire(game.SIZE, game._star_ship, category=game._rng.choice(self.CATEGORIES), rng=game._rng))
+
+    def wave_size(self, wave):
+        return self.FIRST_WAVE + self.GROWTH * (wave - 1)
+
+    def on_destroyed(self, category, position):
+        if self.governor.level >= LoadGovernor.EFFECTS or len(self.effects) >= self.MAX_SPARKS:
+            if self._wave is not None:
+                self._wave["sparks_dropped"] += self.SPARKS
+            return
+        for i in range(self.SPARKS): #Direcciones fijas, así no se gasta el generador aleatorio de la partida en algo decorativo
+            self.effects.append(self._pool.acquire(self._screen_size, position, Vector2(1, 0).rotate(45 * category + 90 * i)))
+
+    def update_effects(self): #Lo ejecuta EffectsSystem: mueve las chispas y devuelve al pool las que se apagan
+        self._pool.recycle()
+        for spark in self.effects:
+            spark.move()
+            spark.life -= 1
+            if spark.life <= 0:
+                self._pool.release(spark)
+        self.effects[:] = [spark for spark in self.effects if spark.life > 0]
+
+    def observe(self, game, record): #Después de cada frame dibujado, con el registro del FrameProfiler
+        work_ms = record["total"] - record["idle"]
+        self.governor.observe(work_ms)
+        if self.governor.level >= LoadGovernor.EFFECTS and self.effects: #Las chispas que ya había también se quitan
+            for spark in self.effects:
+                self._pool.release(spark)
+            self.effects.clear()
+        capped, self._capped = game._sound.capped - self._capped, game._sound.capped
+        wave = self._wave
+        if wave is None:
+            return
+        wave["frames"] += 1
+        wave["steps"] += record["steps"]
+        wave["frame_ms_total"] += work_ms
+        wave["frame_ms_max"] = max(wave["frame_ms_max"], work_ms)
+        wave["frame_ms_bins"][min(int(work_ms / self.FRAME_MS_BIN), self.FRAME_MS_BINS - 1)] += 1
+        wave["max_shedding"] = max(wave["max_shedding"], self.governor.level)
+        wave["shedding_frames"] += self.governor.level > 0
+        wave["sounds_capped"] += capped
+        wave["sprites_simplified"] += game._queue.simplified
+        wave["peak_entities"] = max(wave["peak_entities"], len(game._asteroids) + len(game._bullets) + len(self.effects))
+
+    def _finish_wave(self, game): #Cierra la telemetría de la oleada y, si se indica un fichero, la añade como una línea JSON
+        wave = self._wave
+        bins = wave.pop("frame_ms_bins")
+        total = wave.pop("frame_ms_total")
+        rank, p95 = int(wave["frames"] * 0.95), 0.0 #p95: borde superior de la barra del histograma en la que está, sin pasar del máximo
+        for index, count in enumerate(bins):
+            rank -= count
+            if rank < 0:
+                p95 = min((index + 1) * self.FRAME_MS_BIN, wave["frame_ms_max"])
+                break
+        wave.update(duration=(game.frame - wave["frame"]) * game.TIMESTEP,
+                    frame_ms_mean=total / wave["frames"] if wave["frames"] else 0.0,
+                    frame_ms_p95=p95,
+                    frame_ms_max=wave.pop("frame_ms_max"),
+                    max_shedding=LoadGovernor.NAMES[wave["max_shedding"]])
+        self.telemetry.append(wave)
+        if game.telemetry_path is not None and wave["wave"] > self._logged:
+            self._logged = wave["wave"]
+            with open(game.telemetry_path, "a") as file:
+                file.write(json.dumps(wave) + "\n")
+
+    def finish(self, game): #Al terminar la partida se cierra la telemetría de la última oleada
+        if self._wave is not None:
+            self._finish_wave(game)
+            self._wave = None
+
+    def state(self): #Lo que guarda WorldSnapshot: los valores de STATE y, si hay oleada en curso, los de WAVE
+        governor, wave = self.governor, self._wave
+        state = (governor.level, governor.average_ms, governor._since, wave is not None)
+        if wave is None:
+            return state, None
+        return state, tuple(wave[name] for name in self.WAVE_FIELDS) + tuple(wave["frame_ms_bins"])
+
+    def set_state(self, game, state, wave): #Inverso de state(); se olvida la telemetría de las oleadas que aún no habían terminado en el snapshot
+        self.governor.level, self.governor.average_ms, self.governor._since, _ = state
+        last = game._next_wave - 1 if wave is not None else game._next_wave #Última oleada terminada
+        self.telemetry[:] = [record for record in self.telemetry if record["wave"] <= last]
+        self.waves = game._next_wave
+        if wave is None:
+            self._wave = None
+            return
+        count = len(self.WAVE_FIELDS)
+        self._wave = {"seed": game.seed, **dict(zip(self.WAVE_FIELDS, wave[:count])), "frame_ms_bins": list(wave[count:])}
+
+    def stats(self):
+        return {"waves": self.waves,
+                "next_wave_size": self.wave_size(self.waves + 1),
+                "shedding": LoadGovernor.NAMES[self.governor.level],
+                "average_frame_ms": self.governor.average_ms}
+
+''' ******************************************************
+    ********               SISTEMAS               ********
+    ******************************************************'''
+class System: #Una parte de la lógica de un frame, se ejecuta sobre las listas de objetos del juego
+    name = "system"
+
+    def run(self, game):
+        raise NotImplementedError
+
+class SpawnSystem(System): #Oleadas del nivel, aparición del boss y sus escudos, y disparos de los escudos
+    name = "spawn"
+    MAX_ENEMY_BULLETS = 8 #Balas enemigas en pantalla como máximo
+
+    def run(self, game):
+        game._spawn_waves()
+        boss = game._level.boss
+        if boss is None:
+            return
+        if game._boss is None:
+            game._boss = Boss(game.SIZE, position=Vector2(boss["spawn"]), velocity=None, arrival=boss["arrival"], patrol=boss["patrol"], lives=boss["lives"])
+        if game._boss.position == game._boss.ARRIVAL and len(game._escudos) == 0: #Cuando el boss llegue a su posicón y comience la batalla aparecerán los escudos
+            for posicion in game._level.escudos: #Los escudos solo se crean en este momento, sacándolos del pool
+                game._escudos.append(game._pools["escudo"].acquire(game.SIZE, position=Vector2(posicion), velocity=None, patrol=game._boss.PATROL))
+            if game._bossLife is None:
+                game._bossLife = BossLife(game.SIZE, game._boss, game.events)
+        for escudo in game._escudos:
+            if escudo.position.y>=game._boss.ARRIVAL.y and len(game._bulletsEnemigos)<self.MAX_ENEMY_BULLETS: #Solo disparan los escudos delanteros, y disparan una nueva bala cada vez que la que ya está en pantalla sale de la misma
+                if buscar_escudo(game._bulletsEnemigos,escudo):
+                    game._sound_queue.append("BossShot")
+                    game._spawn(game._bulletsEnemigos, game._pools["enemy_bullet"].acquire(escudo,True), wrap=False)
+
+class MovementSystem(System): #Mueve todos los objetos según su velocidad
+    name = "movement"
+
+    def run(self, game):
+        if game._store is not None: #Con EntityStore asteroides y balas se mueven de una vez
+            game._store.integrate()
+        else:
+            for objects in (game._asteroids, game._bullets, game._bulletsEnemigos):
+                for obj in objects:
+                    obj.move()
+        for escudo in game._escudos:
+            escudo.move()
+        if game._boss is not None:
+            game._boss.move()
+        for ship in game._ships:
+            if not ship._disabled:
+                ship.move()
+
+class WrapSystem(System): #Los objetos que salen de la pantalla aparecen por el otro lado, salvo las balas que se eliminan
+    name = "wrap"
+
+    def run(self, game):
+        if game._store is not None:
+            game._store.wrap_all()
+        else:
+            for asteroid in game._asteroids:
+                asteroid.wrap()
+        for escudo in game._escudos:
+            escudo.wrap()
+        if game._boss is not None:
+            game._boss.wrap()
+        for ship in game._ships:
+            ship.wrap()
+        game._remove_out_of_bounds(game._bullets)
+        game._remove_out_of_bounds(game._bulletsEnemigos)
+
+class CollisionSystem(System): #Busca los contactos del frame y los deja en game._contacts como (tipo, objetivo, bala o nave); cada bala del jugador solo cuenta para el primer objetivo que toca
+    name = "collision"
+
+    def run(self, game):
+        contacts = game._contacts
+        ships = [ship for ship in game._ships if not ship._disabled]
+        if game._store is not None:
+            boss_hits = self._store_contacts(game, ships)
+        else:
+            boss_hits = self._grid_contacts(game, ships)
+        for bullet in game._bulletsEnemigos:
+            for ship in ships:
+                if bullet.collides_with(ship):
+                    contacts.append(("ship", bullet, ship))
+        contacts.extend(("boss", game._boss, bullet) for bullet in boss_hits)
+
+    def _grid_contacts(self, game, ships): #Asteroides y escudos contra las balas, con SpatialHash como fase amplia; devuelve las balas libres que tocan al boss
+        contacts = game._contacts
+        used = set()
+        game._grid.rebuild(game._bullets)
+        for targets, kind in ((game._asteroids, "asteroid"), (game._escudos, "escudo")):
+            for target in targets:
+                bullet = next((bullet for bullet in game._grid.collisions(target) if bullet not in used), None)
+                if bullet is not None:
+                    used.add(bullet)
+                    contacts.append((kind, target, bullet))
+                else:
+                    for ship in ships:
+                        if target.collides_with(ship):
+                            contacts.append(("ship", target, ship))
+        if game._boss is None:
+            return []
+        return [bullet for bullet in game._grid.collisions(game._boss) if bullet not in used]
+
+    def _store_contacts(self, game, ships): #Los mismos contactos que _grid_contacts, con una matriz de colisiones por frame de los objetivos contra las balas y contra las naves
+        store = game._store
+        store.checks = 0
+        targets = game._asteroids + game._escudos
+        bullets = [bullet for bullet in game._bullets if not bullet._disabled]
+        position, _, radius = store.read(targets)
+        bullet_position, _, bullet_radius = store.read(bullets)
+        bullet_hits = {}
+        for i, j in zip(*store.pairs(position, radius, bullet_position, bullet_radius)):
+            bullet_hits.setdefault(i, []).append(j)
+        ship_hits = {}
+        if ships:
+            ship_position = np.array([(ship.position.x, ship.position.y) for ship in ships])
+            ship_radius = np.array([ship.radius for ship in ships])
+            for i, j in zip(*store.pairs(position, radius, ship_position, ship_radius)):
+                ship_hits.setdefault(i, []).append(j)
+        asteroids = len(game._asteroids)
+        used = set()
+        for i in sorted(bullet_hits.keys() | ship_hits.keys()): #Solo los objetivos que tocan algo, en el orden de sus listas
+            bullet = next((j for j in bullet_hits.get(i, ()) if j not in used), None)
+            if bullet is not None:
+                used.add(bullet)
+                game._contacts.append(("asteroid" if i < asteroids else "escudo", targets[i], bullets[bullet]))
+            else:
+                game._contacts.extend(("ship", targets[i], ships[j]) for j in ship_hits.get(i, ()))
+        boss = game._boss
+        if boss is None:
+            return []
+        _, hits = store.pairs(np.array([(boss.position.x, boss.position.y)]), np.array([boss.radius]), bullet_position, bullet_radius)
+        return [bullets[j] for j in hits if j not in used]
+
+class DamageSystem(System): #Aplica los contactos: destruye o divide objetivos, daña al boss y a la nave, y lleva la cuenta de la inmunidad una vez por frame
+    name = "damage"
+
+    def __init__(self, split=False):
+        self.split = split #Si es True los asteroides grandes y medianos se dividen en dos del tamaño siguiente
 
-    def update(self): #Se hace override al método de la clase padre *update* para adaptarla al objeto
-        if self.boss.LIVES == 5:
-            self.sprite = load_image(self.SPRITES.get(5))
-        if self.boss.LIVES == 4:
-           self.sprite = load_image(self.SPRITES.get(4))
-        if self.boss.LIVES == 3:
-           self.sprite = load_image(self.SPRITES.get(3))
-        if self.boss.LIVES == 2:
-            self.sprite = load_image(self.SPRITES.get(2))
-        if self.boss.LIVES == 1:
-           self.sprite = load_image(self.SPRITES.get(1))
-        if self.boss.LIVES == 0:
-           self.sprite = load_image(self.SPRITES.get(0))
+    def run(self, game):
+        ship = game._star_ship
+        immune = [ship for ship in game._ships if ship.INMUNITY > 0]
+        for kind, target, bullet in game._contacts:
+            if kind == "ship":
+                bullet.hit(game.events) #En los contactos con una nave el tercer elemento es la nave
+            elif kind == "boss":
+                if target.hit(game.events):
+                    game._sound_queue.append("AsteroidSound")
+                    game._despawn(game._bullets, bullet)
+            else:
+                game._sound_queue.append("AsteroidSound") #Sonido de destrucción
+                game.destroyed += 1
+                if kind == "asteroid":
+                    game.events.publish(Events.ASTEROID_DESTROYED, category=target.CATEGORY, position=target.position)
+                    game._despawn(game._asteroids, target)
+                    if self.split and target.CATEGORY < 3: #Los grandes se dividen en dos medianos y los medianos en dos pequeños
+                        posicion = target.position
+                        for _ in range(2):
+                            game._spawn(game._asteroids, game._pools["asteroid"].acquire(game.SIZE, ship, position = posicion, category = target.CATEGORY + 1, rng = game._rng))
+                else:
+                    game.events.publish(Events.SHIELD_DESTROYED)
+                    game._despawn(game._escudos, target)
+                game._despawn(game._bullets, bullet)
+        game._contacts.clear()
+        for ship in immune: #La inmunidad dura INMUNITY_TIME segundos, INMUNITY cuenta los pasos
+            ship.INMUNITY += 1
+            if ship.INMUNITY >= round(ship.INMUNITY_TIME / game.TIMESTEP):
+                ship.INMUNITY = 0
+
+class AudioSystem(System): #Reproduce los efectos pedidos por el resto de sistemas durante el frame
+    name = "audio"
+
+    def run(self, game):
+        if game._sound.frame_limit is not None: #Si no pueden sonar todos, primero los más importantes
+            game._sound_queue.sort(key=game.SOUND_EFFECTS.get, reverse=True)
+        for name in game._sound_queue:
+            game._sound.play(name)
+        game._sound_queue.clear()
+
+class SurvivalSystem(System): #Oleadas del modo supervivencia, ver Survival
+    name = "survival"
+
+    def run(self, game):
+        game._survival.spawn(game)
+
+class EffectsSystem(System): #Chispas decorativas del modo supervivencia
+    name = "effects"
+
+    def run(self, game):
+        game._survival.update_effects()
+
+class SystemScheduler: #Ejecuta los sistemas de un nivel siempre en el mismo orden y mide cuánto tarda cada uno
+    def __init__(self, systems):
+        self.systems = systems
+        self.times = {system.name: 0.0 for system in systems} #Milisegundos del último frame por sistema
+        self.totals = dict(self.times) #Milisegundos acumulados por sistema
+
+    def run(self, game):
+        for system in self.systems:
+            start = perf_counter()
+            system.run(game)
+            elapsed = (perf_counter() - start) * 1000
+            self.times[system.name] = elapsed
+            self.totals[system.name] += elapsed
 
 ''' ******************************************************
     ********                JUEGO                 ********
     ******************************************************'''
 class Asteroids:
     SIZE = Vector2(1024, 768)  # Display (width, height)
-    MAX_ASTEROIDS = 10
+    LEVELS = "levels.json" #Niveles de la partida, en orden
     MUSIC = "music/tota_pop.ogg"
+    SOUND_EFFECTS = {"BossShot": 0, #Efectos de sonido y su prioridad, las explosiones pueden cortar a los disparos
+                     "PlayerShot": 1,
+                     "AsteroidSound": 2}
+    EFFECT_CHANNELS = (2, 19) #Primer canal y número de canales reservados a efectos, el canal 1 es el de la música
     WINDOW_TITLE = "ASTEROIDS MIGUEL VERSION"
     BACKGROUND = "background"
+    ATLAS = "images/atlas.bin" #Generado con --build-atlas; si no existe o está desactualizado se leen los PNG
     VICTORY_TEXT = "Victory!!!!!!!!!"
     GAME_OVER_TEXT = "Game Over"
+    FPS = 60 #Pasos de simulación por segundo; las velocidades del juego están en píxeles por paso, así que la partida va a la misma velocidad con cualquier frecuencia de dibujo
+    TIMESTEP = 1 / FPS #Paso fijo de la simulación en segundos, la lógica avanza siempre un frame de juego por llamada a step()
+    RENDER_FPS = None #Frames dibujados por segundo como máximo; None para usar la frecuencia de refresco de la pantalla
+    MAX_STEPS_PER_FRAME = 5 #Si el dibujo se retrasa se simulan varios pasos seguidos sin dibujar, hasta este límite
+    MAX_FRAME_TIME = 0.25 #Segundos como máximo que se recuperan de un frame muy lento, para no intentar alcanzar un retraso enorme
+    ENTITY_STORE = False #Si es True y NumPy está instalado, asteroides y balas se guardan en un EntityStore y se actualizan en bloque
+    DIRTY_RECTS = False #Si es True solo se redibujan y actualizan las zonas de la pantalla que cambian
+    DIRTY_THRESHOLD = 0.5 #Fracción de pantalla sucia a partir de la cual se vuelve a hacer un flip completo
+    record_path = None #Si se indica un fichero, mainloop guarda ahí la grabación de la partida al terminar o al salir
+    profile_path = None #Igual para los tiempos de los frames, en JSON o CSV
+    REWIND_SECONDS = 10 #Segundos de partida que se guardan para poder rebobinar; 0 para no guardar historial
+    RECORD = True #Si es False no se guardan las acciones de cada frame en la InputLog (entornos de entrenamiento, servidor) y la partida no se puede grabar
+    KEYFRAME_INTERVAL = 30 #Frames entre dos snapshots completos del historial, entre ellos solo se guardan las acciones
+    REWIND_SPEED = 2 #Frames que se retroceden por paso mientras se mantiene pulsada la tecla de rebobinar
+    QUICKSAVE = "quicksave.snap" #Fichero del guardado rápido (F5 guarda, F9 carga)
+    CRASH_DUMP = "crash_frame%d.rewind" #Si el juego falla se vuelca aquí el historial, se puede abrir con --load-state
+    ENDLESS = False #Si es True la partida es el modo supervivencia: oleadas cada vez mayores, sin niveles ni final
+    AUTO_RESTART = None #Segundos tras los que la partida se reinicia sola al terminar (modo kiosco), None para esperar a la barra espaciadora
+    telemetry_path = None #En el modo supervivencia se añade a este fichero una línea JSON por oleada
+    COMMON_IMAGES = ("star_ship.v2", "star_ship.v2.thrust", "star_ship.v2.brake", #Sprites que se usan en todos los niveles
+                     "invulnerable", "invulnerable1", "invulnerable2", "bullet",
+                     "PlayerLife0", "PlayerLife1", "PlayerLife2", "PlayerLife3")
+    ASTEROID_IMAGES = {1: "asteroid.v2", 2: "asteroid.v3", 3: "asteroid.v4"} #Sprite de cada categoría de asteroide
+    BOSS_IMAGES = ("Boss", "escudopng", "bulletenemigo", #Sprites de los niveles con boss
+                   "BossLife0", "BossLife1", "BossLife2", "BossLife3", "BossLife4", "BossLife5", "BossLife6")
+    IMAGES = ("asteroid.v2", "asteroid.v3", "asteroid.v4", #Todos los sprites, se precargan al iniciar el juego en modo headless o con el atlas
+              "star_ship.v2", "star_ship.v2.thrust", "star_ship.v2.brake",
+              "invulnerable", "invulnerable1", "invulnerable2",
+              "bullet", "bulletenemigo", "escudopng", "Boss",
+              "PlayerLife0", "PlayerLife1", "PlayerLife2", "PlayerLife3",
+              "BossLife0", "BossLife1", "BossLife2", "BossLife3", "BossLife4", "BossLife5", "BossLife6")
 
-    def __init__(self):  # public Asteroids() { ... } en Java - Constructor
+    def __init__(self, headless=False, input_source=None, seed=None, **settings):  # public Asteroids() { ... } en Java - Constructor
+        for name, value in settings.items(): #Opciones de la clase que cambian solo para esta partida, p. ej. ENTITY_STORE=True o REWIND_SECONDS=0
+            if not name.isupper() or not hasattr(Asteroids, name):
+                raise TypeError("Asteroids no tiene la opción %s" % name)
+            setattr(self, name, value)
+        self.headless = headless #Sin ventana ni sonido, pensado para pruebas automáticas y máquinas sin pantalla
+        self._input = input_source if input_source is not None else KeyboardInput()
+        self.seed = seed if seed is not None else random.getrandbits(32) #Semilla de la partida, con la misma semilla y las mismas entradas la partida es idéntica
         self._init_game()
 
     def _init_game(self):
-        pygame.init() #Comienza el Juego
-        pygame.mixer.init() #Comienza el reproductor de sonido de pygame
-        pygame.mixer.set_num_channels(21) #Se establece el número de canales en 21
-        pygame.mixer.Channel(1).set_volume(0.1) #Se establece el volumen de los canales para que no sea demasiado alto
-        pygame.mixer.Channel(2).set_volume(0.1)
-        pygame.mixer.Channel(3).set_volume(0.1)
-        pygame.mixer.Channel(1).play(pygame.mixer.Sound(self.MUSIC),-1) #Se comienza a reproducir el canal 1, con la cancion de fondo
+        if self.headless: #Se usan los drivers dummy de SDL y no se inicia el mixer
+            os.environ["SDL_VIDEODRIVER"] = "dummy"
+            os.environ["SDL_AUDIODRIVER"] = "dummy"
+            pygame.display.init()
+            pygame.font.init()
+            self._sound = SilentChannelAllocator(self.SOUND_EFFECTS)
+        else:
+            pygame.init() #Comienza el Juego
+            pygame.mixer.init() #Comienza el reproductor de sonido de pygame, es la única vez que se inicia
+            pygame.mixer.set_num_channels(21) #Se establece el número de canales en 21
+            SOUNDS.preload(self.SOUND_EFFECTS) #Se decodifican todos los efectos antes del primer frame
+            self._sound = ChannelAllocator(*self.EFFECT_CHANNELS, priorities=self.SOUND_EFFECTS)
+            MUSIC.play(self.MUSIC) #Se comienza a reproducir la cancion de fondo, sin decodificarla entera
         pygame.display.set_caption(self.WINDOW_TITLE)
+        self._profiler = FrameProfiler() #Tiempos y contadores de cada frame
+        self._pools = {"asteroid": ObjectPool(Asteroid), #Los pools duran toda la ejecución, también entre partidas
+                       "bullet": ObjectPool(Bullet),
+                       "enemy_bullet": ObjectPool(Bullet),
+                       "escudo": ObjectPool(Escudos)}
+        self._frame_steps = 1 #Pasos de simulación del último frame dibujado
+        self._quicksave = None #Último guardado rápido de esta ejecución
+        self._snapshot_times = {name: deque(maxlen=240) for name in ("snapshot", "restore", "rewind")} #Microsegundos de las últimas operaciones de cada tipo
+        self._renderer = DirtyRectRenderer(self.DIRTY_THRESHOLD) if self.DIRTY_RECTS else Renderer()
+        self._queue = RenderQueue(self.SIZE) #Cola de dibujo de los objetos de la partida
         # when attribute name starts with _ (underscore), marks that attribute as protected
         self._font = pygame.font.Font(None, 64)
+        self._score_font = pygame.font.Font(None, 40)
         # set window size
         self._screen = pygame.display.set_mode([int(value) for value in self.SIZE.xy])
-        self._background = load_image(self.BACKGROUND)
-        # Background scale
-        self._background = smoothscale(self._background, [int(value) for value in self.SIZE.xy])
+        start = perf_counter()
+        atlas = SpriteAtlas.load(self.ATLAS, self.SIZE, self.image_paths()) if self.ATLAS else None
+        if atlas is not None:
+            ASSETS.add_atlas(atlas)
+        self._levels = load_levels(self.LEVELS) if not self.ENDLESS else [Level("Supervivencia", "endless")] #Se leen y validan una sola vez, también sirven para las siguientes partidas
+        self.levels_digest = levels_digest(self.LEVELS) if not self.ENDLESS else bytes(8) #El modo supervivencia no usa el fichero de niveles
+        if self.headless or atlas is not None:
+            ASSETS.preload(self.IMAGES) #Se cargan todos los sprites antes del primer frame
+        else: #Solo los del primer nivel, los del siguiente se leen en segundo plano mientras se juega (ver _start_level)
+            ASSETS.preload(self.COMMON_IMAGES + self.level_images(self._levels[0]))
+        if atlas is not None:
+            self._background = atlas.background
+        else:
+            self._background = load_image(self.BACKGROUND)
+            # Background scale
+            self._background = smoothscale(self._background, [int(value) for value in self.SIZE.xy])
+        self.asset_time = perf_counter() - start #Segundos que tarda la carga de imágenes al arrancar
         self._init_objects()
 
+    @classmethod
+    def image_paths(cls): #PNG de los que se genera el atlas
+        return [AssetCache.IMAGES_DIR + name + ".png" for name in cls.IMAGES + (cls.BACKGROUND,)]
+
+    @classmethod
+    def build_atlas(cls): #Genera el fichero ATLAS a partir de los PNG, hay que volver a ejecutarlo al cambiar las imágenes
+        atlas, cls.ATLAS = cls.ATLAS, None
+        try:
+            game = cls(headless=True) #Hace falta una pantalla para convertir las imágenes
+            return SpriteAtlas.build(atlas, cls.IMAGES, cls.BACKGROUND, game.SIZE)
+        finally:
+            cls.ATLAS = atlas
+
+    @classmethod
+    def level_images(cls, level): #Sprites que necesita un nivel además de COMMON_IMAGES
+        categories = {category for wave in level.waves for category in wave.categories}
+        if level.phase == "endless": #Las oleadas se crean durante la partida y pueden traer cualquier categoría
+            categories = set(cls.ASTEROID_IMAGES)
+        elif level.phase == "phase2": #Los asteroides se dividen en los de las categorías siguientes
+            categories = {split for category in categories for split in range(category, 4)}
+        images = tuple(cls.ASTEROID_IMAGES[category] for category in sorted(categories))
+        return images + cls.BOSS_IMAGES if level.boss is not None else images
+
+    def _prefetch_level(self, index): #Pide al hilo de precarga las imágenes y la música de un nivel
+        if self.headless or index >= len(self._levels):
+            return
+        level = self._levels[index]
+        ASSETS.prefetch(self.level_images(level))
+        if level.music is not None:
+            MUSIC.prefetch(level.music)
+
     def _init_objects(self): #Crea los atributos para alamcenar los objetos que se van a usar en la partida
+        self._release_all()
+        self._rng = random.Random(self.seed) #Cada partida tiene su propio generador aleatorio
+        self.input_log = self._new_input_log() #Acciones de cada frame, para poder grabar y reproducir la partida
+        self.events = EventBus() #Eventos de esta partida, los HUD se suscriben al crearse
         self._star_ship = StarShip(self.SIZE) #Nave del jugador
-        self._playerLife = PlayerLifes(self.SIZE,player = self._star_ship) #Vidas del jugador   
+        self._ships = [self._star_ship] #Todas las naves de la partida, la primera es la del jugador local
+        self._playerLife = PlayerLifes(self.SIZE,player = self._star_ship, events = self.events) #Vidas del jugador   
+        self._score = ScoreText(Vector2(self.SIZE.x - 30, 30), self._score_font, self.events) #Puntuación
         self._bullets = [] #Balas disparadas por el jugador
         self._asteroids = [] #Asteroides en pantalla
         self._boss = None #Boss
         self._bossLife = None #Vida del Boss
         self._escudos = [] #Escudos del Boss
         self._bulletsEnemigos = [] #Balas disparadas por los escudos
+        self._dead = 0 #Objetos eliminados que aún no se han quitado de sus listas
+        self.destroyed = 0 #Asteroides y escudos destruidos por el jugador en esta partida
+        self._contacts = [] #Contactos del frame, los encuentra CollisionSystem y los aplica DamageSystem
+        self._sound_queue = [] #Efectos pedidos durante el frame, los reproduce AudioSystem
+        self._store = EntityStore(self.SIZE) if self.ENTITY_STORE and np is not None else None
+        self._grid = self._store if self._store is not None else SpatialHash(self.SIZE) #Fase amplia de las colisiones con las balas del jugador
+        self.frame = 0 #Frames de juego simulados desde el comienzo de la partida
+        self._survival = Survival(self) if self.ENDLESS else None #Oleadas, recorte de carga y telemetría del modo supervivencia
+        self._sound.frame_limit = None
+        self._start_level(0)
+        self._rewind = RewindBuffer(round(self.REWIND_SECONDS * self.FPS), self.KEYFRAME_INTERVAL, self.FPS) if self.REWIND_SECONDS else None
+        if self._rewind is not None:
+            self._rewind.reset(self)
 
-        for _ in range(self.MAX_ASTEROIDS):
-            self._asteroids.append(Asteroid(self.SIZE, self._star_ship, category = 1))
+    def _start_level(self, index): #Comienza un nivel: las oleadas se crean cuando se cumple su condición, no antes
+        self._level_index = index
+        self._level = self._levels[index]
+        self._set_phase(self._level.phase)
+        self._systems = self._build_systems(self._level)
+        self._level_frame = 0
+        self._next_wave = 0
+        if self._level.music is not None and not self.headless:
+            MUSIC.play(self._level.music)
+        self._prefetch_level(index + 1) #Mientras se juega este nivel se va leyendo el siguiente
+        self._spawn_waves()
 
-    def _handle_input(self): #Método para que el programa entienda las pulsaciones de las teclas durante la partida
-        for event in pygame.event.get():
-            if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE):
-                quit()
-            # shoot when press space
-            elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE:
-                pygame.mixer.Channel(2).play(pygame.mixer.Sound('music/PlayerShot.ogg'))
-                self._bullets.append(Bullet(self._star_ship,False))
+    def _set_phase(self, phase): #Fase actual: la del nivel, game_over o victory
+        self._phase = phase
+        self.events.publish(Events.PHASE_CHANGE, phase=phase)
 
-        is_key_pressed = pygame.key.get_pressed()
+    def _spawn_waves(self):
+        waves = self._level.waves
+        while self._next_wave < len(waves) and waves[self._next_wave].triggered(self._level_frame, self._asteroids):
+            for category in waves[self._next_wave].categories:
+                self._spawn(self._asteroids, self._pools["asteroid"].acquire(self.SIZE, self._star_ship, category = category, rng = self._rng))
+            self._next_wave += 1
+
+    def _level_complete(self):
+        if self._phase == "endless":
+            return False
+        if self._phase == "boss_phase":
+            return self._boss is not None and self._boss.LIVES == 0
+        return self._next_wave == len(self._level.waves) and not self._asteroids
+
+    def _spawn(self, objects, obj, wrap=True): #Añade un asteroide o una bala a su lista y, si se usa, al EntityStore
+        objects.append(obj)
+        if self._store is not None:
+            self._store.attach(obj, wrap)
+        return obj
+
+    def _despawn(self, objects, obj): #Marca el objeto como eliminado y lo devuelve a su pool; se quita de la lista en _compact()
+        if obj._disabled:
+            return obj
+        obj.disable()
+        self._dead += 1
+        if obj._store is not None:
+            obj._store.detach(obj)
+        if obj._pool is not None:
+            obj._pool.release(obj)
+        return obj
+
+    def _compact(self): #Quita de las listas los objetos eliminados con una pasada por lista, en vez de un list.remove por objeto, y conservando el orden
+        if not self._dead:
+            return
+        for objects in (self._asteroids, self._bullets, self._escudos, self._bulletsEnemigos):
+            objects[:] = [obj for obj in objects if not obj._disabled]
+        self._dead = 0
+
+    def _begin_tick(self): #Comienzo de cada fase: las listas quedan limpias y lo liberado en el frame anterior ya se puede reutilizar
+        self._compact()
+        for pool in self._pools.values():
+            pool.recycle()
+
+    def _release_all(self): #Devuelve a los pools todos los objetos de la partida anterior
+        for objects in (getattr(self, "_asteroids", ()), getattr(self, "_bullets", ()), getattr(self, "_escudos", ()), getattr(self, "_bulletsEnemigos", ())):
+            for obj in objects:
+                if obj._pool is not None and not obj._disabled:
+                    obj._pool.release(obj)
+
+    def pool_stats(self):
+        return {name: pool.stats() for name, pool in self._pools.items()}
+
+    def _remove_out_of_bounds(self, bullets): #Se borran las balas que salen de la pantalla
+        out = self._store.out_of_bounds(bullets) if self._store is not None else [bullet for bullet in bullets if bullet.is_out_of_bounds()]
+        for bullet in out:
+            self._despawn(bullets, bullet)
+
+    def _handle_input(self, actions): #Método para que el programa entienda las acciones del jugador durante la partida, devuelve False si quiere salir
+        if actions & Actions.QUIT:
+            return False
+        self._control_ship(self._star_ship, actions)
+        return True
+
+    def _control_ship(self, ship, actions): #Aplica a una nave las acciones de su jugador
+        if ship._disabled:
+            return
+        # shoot when press space
+        if actions & Actions.SHOOT:
+            self._sound_queue.append("PlayerShot")
+            self._spawn(self._bullets, self._pools["bullet"].acquire(ship,False), wrap=False)
 
         # control star ship movement
-        if is_key_pressed[pygame.K_RIGHT]:
-            self._star_ship.rotate(clockwise=True)
-        elif is_key_pressed[pygame.K_LEFT]:
-            self._star_ship.rotate(clockwise=False)
-        elif is_key_pressed[pygame.K_UP]:
-            self._star_ship.thrust()
-        elif is_key_pressed[pygame.K_DOWN]:
-            self._star_ship.thrust(brake=True)
-
-    def _draw(self): #Método para dibujar en pantalla los objetos 
-        self._screen.blit(self._background, (0, 0))
-        for asteroid in self._asteroids: 
-            asteroid.draw(self._screen)
-        for bullet in self._bullets:
-            bullet.draw(self._screen)
-        self._playerLife.draw(self._screen)
-        self._playerLife.update()
-        self._star_ship.draw(self._screen)
+        ship.release()
+        if actions & Actions.RIGHT:
+            ship.rotate(clockwise=True)
+        elif actions & Actions.LEFT:
+            ship.rotate(clockwise=False)
+        elif actions & Actions.UP:
+            ship.thrust()
+        elif actions & Actions.DOWN:
+            ship.thrust(brake=True)
+
+    def add_player(self): #Añade otra nave a la partida, para el modo multijugador; aparece a un lado del centro según el número de naves
+        offset = Vector2(80 * ((len(self._ships) + 1) // 2), 0) * (1 if len(self._ships) % 2 else -1)
+        ship = StarShip(self.SIZE, position=self.SIZE // 2 + offset)
+        self._ships.append(ship)
+        return ship
+
+    def remove_player(self, ship):
+        ship.disable()
+        if ship is not self._star_ship:
+            self._ships.remove(ship)
+
+    def _draw(self, alpha=1.0): #Método para dibujar en pantalla los objetos; alpha es la fracción de paso transcurrida desde el último, para interpolar las posiciones
+        self._renderer.begin(self._screen, self._background)
+        rects = self._renderer.rects #El DirtyRectRenderer solo actualiza las zonas dibujadas
+        queue = self._queue
+        queue.begin()
+        survival = self._survival
+        if survival is not None and survival.governor.level >= LoadGovernor.FAR_SPRITES: #Con carga los asteroides lejanos de la nave se dibujan simplificados
+            queue.far = (self._star_ship.position.x, self._star_ship.position.y, survival.FAR_DISTANCE)
+        else:
+            queue.far = None
+        queue.add_objects("asteroids", self._asteroids, alpha, self._store)
+        queue.add_objects("bullets", self._bullets, alpha, self._store)
+        if survival is not None:
+            queue.add_objects("effects", survival.effects, alpha)
+        queue.add("hud", *self._playerLife.blit_args())
+        queue.add("hud", *self._score.blit_args())
+        for ship in self._ships:
+            if not ship._disabled or ship is self._star_ship:
+                queue.add("ships", *ship.blit_args(alpha))
         if self._boss is not None: #Dado que el boss solo aparece en el tercer nivel, este se dibuja cuando es almacenado en el atributo
-            self._boss.draw(self._screen)
+            queue.add("boss", *self._boss.blit_args(alpha))
         if self._bossLife is not None: #Solo se dibuja en pantalla cuando ya ha comenzado la batalla con el boss
-            self._bossLife.draw(self._screen)
-            self._bossLife.update()
+            queue.add("boss_hud", *self._bossLife.blit_args())
         if len(self._escudos) != 0:
-            for escudo in self._escudos:
-                escudo.draw(self._screen)
-            for disparo in self._bulletsEnemigos:
-                disparo.draw(self._screen)
-            
-        pygame.display.flip()
+            queue.add_objects("escudos", self._escudos, alpha)
+            queue.add_objects("enemy_bullets", self._bulletsEnemigos, alpha, self._store)
+        queue.submit(self._screen, rects if self._renderer.TRACK_RECTS else None)
+        if self._profiler.overlay:
+            rects.append(self._profiler.draw(self._screen))
+        self._profiler.lap("draw")
+        self._renderer.present()
+        self._profiler.lap("flip")
 
-    def phase1(self):
-        for asteroid in self._asteroids: #Actualiza cada uno de los asteroides en pantalla
-            asteroid.update()
-        for bullet in self._bullets: #Actuliza cada bala en pantalla
-            bullet.update()
-            if bullet.is_out_of_bounds():#Se borran las balas que salen de la pantalla
-                self._bullets.remove(bullet)
-        self._star_ship.update()  #Actuliza la nave del jugador
-        #Este bucle comprueba si alguna bala del jugador colisiona con un asteroide, en ese caso lo elimina de la pantalla
-        for asteroid in self._asteroids[:]:
-            destroyed = False
-            for bullet in self._bullets[:]:
-                if bullet.collides_with(asteroid):
-                    pygame.mixer.Channel(2).play(pygame.mixer.Sound('music/AsteroidSound.ogg')) #Reproduce sonido de destrucción
-                    self._asteroids.remove(asteroid)
-                    self._bullets.remove(bullet)
-                    destroyed = True
-                    break
-            if not destroyed and asteroid.collides_with(self._star_ship) and self._star_ship.INMUNITY==0: #En caso de que un asteroide colisione con la nave y ésta no este en modo inmune pierde una vida, y activa el modo inmune
-                self._star_ship.LIVES-=1
-                self._star_ship.INMUNITY+=1 #Comienza la inmunidad del jugador
-                if self._star_ship.LIVES==0: #Cuando la vida del jugaro sea 0 se acaba la partida
-                    self._star_ship.disable()
-                    break
-            if self._star_ship.INMUNITY>0: #Se entiende que el jugador es inmune mientras el atributo inmune sea mayor de 0, la inmunidad dura 999 vueltas del bucle
-                self._star_ship.INMUNITY+=1
-                if self._star_ship.INMUNITY==1000:
-                    self._star_ship.INMUNITY=0
-
-    def phase2(self):
-        for asteroid in self._asteroids: #Actualiza cada uno de los asteroides en pantalla
-            asteroid.update()
-        for bullet in self._bullets: #Actuliza cada bala en pantalla
-            bullet.update()
-            if bullet.is_out_of_bounds():#Se borran las balas que salen de la pantalla
-                self._bullets.remove(bullet)
-        self._star_ship.update() #Actuliza la nave del jugador
-        #El bucle tiene la misma función que en la phase1, pero esta vez al destruir un asteroide comprueba su gategoria y según ésta, aparecerán asteroides más pequeños o no
-        for asteroid in self._asteroids[:]:
-            destroyed = False
-            for bullet in self._bullets[:]:
-                if bullet.collides_with(asteroid):
-                        posicion = asteroid.position
-                        pygame.mixer.Channel(2).play(pygame.mixer.Sound('music/AsteroidSound.ogg')) #Reproduce sonido de destrucción
-                        if asteroid.CATEGORY == 1:
-                            self._asteroids.remove(asteroid)
-                            self._asteroids.append(Asteroid(self.SIZE, self._star_ship, position = posicion, category = 2)) #Aparecen Asteroides medianos
-                            self._asteroids.append(Asteroid(self.SIZE, self._star_ship, position = posicion, category = 2))
-                            self._bullets.remove(bullet)
-                            destroyed = True
-                        elif asteroid.CATEGORY == 2:
-                            self._asteroids.remove(asteroid)
-                            self._asteroids.append(Asteroid(self.SIZE, self._star_ship, position = posicion, category = 3)) #Aparecen Asteroides pequeños
-                            self._asteroids.append(Asteroid(self.SIZE, self._star_ship, position = posicion, category = 3))           
-                            self._bullets.remove(bullet)
-                            destroyed = True
-                        else:
-                            self._asteroids.remove(asteroid)
-                            self._bullets.remove(bullet)
-                            destroyed = True
-                            break
-            if not destroyed and asteroid.collides_with(self._star_ship) and self._star_ship.INMUNITY==0: #Sistema de inmunidad explicado en la phase1
-                self._star_ship.LIVES-=1
-                self._star_ship.INMUNITY+=1
-                if self._star_ship.LIVES==0:
-                    self._star_ship.disable()
-                    break
-            if self._star_ship.INMUNITY>0:
-                self._star_ship.INMUNITY+=1
-                if self._star_ship.INMUNITY==1000:
-                    self._star_ship.INMUNITY=0
-        
+    def _build_systems(self, level): #Sistemas que ejecuta un nivel; phase2 se diferencia de phase1 en que los asteroides se dividen
+        if level.phase == "endless": #Las oleadas las crea Survival y los asteroides se dividen como en phase2
+            return SystemScheduler([SurvivalSystem(),
+                                    MovementSystem(),
+                                    WrapSystem(),
+                                    CollisionSystem(),
+                                    DamageSystem(split=True),
+                                    EffectsSystem(),
+                                    AudioSystem()])
+        return SystemScheduler([SpawnSystem(),
+                                MovementSystem(),
+                                WrapSystem(),
+                                CollisionSystem(),
+                                DamageSystem(split=level.phase == "phase2"),
+                                AudioSystem()])
 
-    
-    def boss_phase(self):
-        for bullet in self._bullets: #Actuliza cada bala del jugador en pantalla
-            bullet.update()
-            if bullet.is_out_of_bounds():
-                self._bullets.remove(bullet)
-        for bullet in self._bulletsEnemigos: #Actualiza cada bala del enemigo en pantalla
-            bullet.update()
-            if bullet.collides_with(self._star_ship) and self._star_ship.INMUNITY==0: #Comprueba si alguna bala enemiga colisiona con el jugador y sigue el procedimiento correspondiente
-                self._star_ship.LIVES-=1
-                self._star_ship.INMUNITY+=1
-                if self._star_ship.LIVES==0:
-                    self._star_ship.disable()
-                    break
-            if self._star_ship.INMUNITY>0:
-                self._star_ship.INMUNITY+=1
-                if self._star_ship.INMUNITY==1000:
-                    self._star_ship.INMUNITY=0
-
-            if bullet.is_out_of_bounds():
-                self._bulletsEnemigos.remove(bullet)
-
-        self._star_ship.update() #Actualiza la nave del jugador
-        escudos = [Escudos(self.SIZE, position=Vector2(512,50), velocity=None), #Escudos del Boss
-                    Escudos(self.SIZE, position=Vector2(512,300), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(452,70), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(452,280), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(392,110), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(392,240), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(332,150), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(332,200), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(572,70), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(572,280), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(632,110), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(632,240), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(692,150), velocity=None),
-                    Escudos(self.SIZE, position=Vector2(692,200), velocity=None)]
-        
-        for escudo in self._escudos:
-            escudo.update() #Actualiza los escudos
-            if escudo.position.y>=200 and len(self._bulletsEnemigos)-1<7: #Solo disparan los escudos delanteros, y disparan una nueva bala cada vez que la que ya está en pantalla sale de la misma
-                if buscar_escudo(self._bulletsEnemigos,escudo):
-                    pygame.mixer.Channel(escudo.IDENTIFICADOR).set_volume(0.1)
-                    pygame.mixer.Channel(escudo.IDENTIFICADOR).play(pygame.mixer.Sound('music/BossShot.ogg'))
-                    self._bulletsEnemigos.append(Bullet(escudo,True))
-            destroyed = False
-            for bullet in self._bullets[:]: #Comprueba si alguna bala del jugador colisiona con algún escudo, en ese caso lo elimina
-                if bullet.collides_with(escudo):
-                    pygame.mixer.Channel(2).play(pygame.mixer.Sound('music/AsteroidSound.ogg'))
-                    self._escudos.remove(escudo)
-                    self._bullets.remove(bullet)
-                    destroyed = True
-                    break
-            if not destroyed and escudo.collides_with(self._star_ship) and self._star_ship.INMUNITY==0: #Comprueba si el jugador colisiona con los escudos, y sigue el procedimiento correspondiente
-                self._star_ship.LIVES-=1
-                self._star_ship.INMUNITY+=1
-                if self._star_ship.LIVES==0:
-                    self._star_ship.disable()
-                    break
-            if self._star_ship.INMUNITY>0:
-                self._star_ship.INMUNITY+=1
-                if self._star_ship.INMUNITY==1000:
-                    self._star_ship.INMUNITY=0
-        if self._boss:
-            for bullet in self._bullets[:]:
-                if bullet.collides_with(self._boss) and self._boss.position.y==200: #Mismo procedimiento para saber si alguna bala del jugador colisiona con el boss, 
-                    pygame.mixer.Channel(2).play(pygame.mixer.Sound('music/AsteroidSound.ogg')) #para que este pueda ser dañado debe haber llegado a su posición.y fija, 
-                    self._boss.LIVES-=1                                            #de esta manera se evita que el jugador lo peuda matar antes de que salgan sus escudos
-                    self._bullets.remove(bullet)
-                if self._boss.LIVES == 0: 
+    def update(self): #Un frame de lógica del nivel actual
+        self._begin_tick()
+        self._systems.run(self)
+        self._compact()
+
+    def is_over(self):
+        return self._phase in ("game_over", "victory")
+
+    def step(self, actions=None, players=None): #Avanza la partida un frame de juego, con las acciones dadas o leyéndolas de la fuente de entrada; players son las acciones de las otras naves (nave -> Actions); devuelve False si el jugador quiere salir
+        if actions is None:
+            actions = self._input.read()
+            if self._survival is not None and self._survival.governor.level >= LoadGovernor.SPAWNS:
+                actions |= Actions.HOLD_WAVE
+        self._sound.new_frame()
+        if actions & Actions.COMMANDS:
+            if self._handle_commands(actions): #Mientras se rebobina no se simula
+                return not actions & Actions.QUIT
+            actions &= ~Actions.COMMANDS
+        if not self._handle_input(actions):
+            return False
+        if players:
+            for ship, ship_actions in players.items():
+                self._control_ship(ship, ship_actions)
+        if self._survival is not None: #En reproducciones y al rebobinar la oleada se retiene según lo grabado, no según la carga actual
+            self._survival.hold = bool(actions & Actions.HOLD_WAVE)
+        if self.RECORD:
+            self.input_log.append(actions)
+        if self._rewind is not None:
+            self._rewind.push(actions)
+        self._profiler.lap("input")
+        self.update()
+        self._profiler.lap("update")
+        self.frame += 1
+        self._level_frame += 1
+        self._advance_phase()
+        if self._rewind is not None:
+            self._rewind.record(self)
+        return True
+
+    def _handle_commands(self, actions): #Panel de tiempos, guardado rápido, carga y rebobinado; devuelve True si el paso se ha usado para rebobinar
+        if actions & Actions.OVERLAY:
+            self._profiler.overlay = not self._profiler.overlay
+        if actions & Actions.QUICKSAVE:
+            self.quick_save()
+        if actions & Actions.QUICKLOAD:
+            self.quick_load()
+        if actions & Actions.REWIND and self._rewind is not None:
+            self.rewind(self.REWIND_SPEED)
+            return True
+        return False
+
+    def _advance_phase(self): #Pasa al siguiente nivel cuando el jugador muere o termina el actual
+        if all(ship.is_disabled() for ship in self._ships):
+            self._set_phase("game_over")
+        elif self._level_complete(): #Se termina el nivel si el jugador ha conseguido destruir todos los asteroides o al boss
+            if self._level_index + 1 < len(self._levels):
+                self._start_level(self._level_index + 1)
+            else:
+                self._set_phase("victory")
+
+    def restart(self, seed=None): #Comienza una nueva partida, por defecto con una semilla sacada de la partida anterior
+        self.seed = seed if seed is not None else self._rng.getrandbits(32)
+        self._init_objects()
+        self._renderer.invalidate() #En pantalla queda el mensaje de fin de partida
+        if not self.headless:
+            MUSIC.play(self.MUSIC) #La musica de fondo vuelve a ser la normal
+
+    def state_hash(self): #Hash de todo el estado que influye en la partida, para comprobar que una reproducción es exacta
+        digest = hashlib.sha1()
+        digest.update(self._phase.encode())
+        digest.update(struct.pack("<Iiiii", self.frame, self._star_ship.LIVES, self._star_ship.INMUNITY,
+                                  self._boss.LIVES if self._boss else -1, len(self._asteroids)))
+        digest.update(struct.pack("<2d", *self._star_ship.direction))
+        for objects in (self._ships, self._asteroids, self._bullets, self._escudos, self._bulletsEnemigos, [self._boss] if self._boss else []):
+            for obj in objects:
+                position, velocity = obj.position, obj.velocity
+                digest.update(struct.pack("<4d", position.x, position.y, velocity.x, velocity.y))
+        return digest.hexdigest()
+
+    def _timed(self, name, start): #Apunta los microsegundos transcurridos desde start
+        self._snapshot_times[name].append((perf_counter() - start) * 1e6)
+
+    def snapshot(self): #Estado completo de la partida en un buffer binario, ver WorldSnapshot
+        start = perf_counter()
+        data = WorldSnapshot.capture(self)
+        self._timed("snapshot", start)
+        return data
+
+    def restore(self, data): #Vuelve al estado de un snapshot; la partida sigue exactamente igual que desde el original. El historial empieza de nuevo, el anterior es de otra línea de la partida
+        end = self.input_log.end()
+        start = perf_counter()
+        WorldSnapshot.restore(self, data)
+        self._timed("restore", start)
+        self._resume_recording(end, data)
+        if self._rewind is not None:
+            self._rewind.reset(self)
+
+    def _new_input_log(self, start=None): #Sin RECORD la grabación se queda vacía y no se puede guardar
+        log = InputLog(self.seed, start=start, endless=self.ENDLESS, levels=self.levels_digest)
+        log.replayable = self.RECORD
+        return log
+
+    def _resume_recording(self, end, data): #Después de cargar un estado: si lo grabado no llega a su frame la grabación empieza de nuevo en él; si llega, no se sabe si el estado sale de lo grabado y ya no se puede guardar
+        if end <= self.frame:
+            self.input_log = self._new_input_log(data)
+        else:
+            self.input_log.replayable = False
+
+    def rewind(self, frames): #Retrocede frames pasos dentro del historial, devuelve el frame al que se llega
+        if self._rewind is None:
+            return self.frame
+        start = perf_counter()
+        frame = self._rewind.rewind(self, frames)
+        self._timed("rewind", start)
+        return frame
+
+    def quick_save(self):
+        self._quicksave = self.snapshot()
+        self.save_state(self.QUICKSAVE, self._quicksave)
+
+    def quick_load(self):
+        if self._quicksave is not None:
+            self.restore(self._quicksave)
+        elif os.path.exists(self.QUICKSAVE):
+            self.load_state(self.QUICKSAVE)
+
+    def save_state(self, path, data=None): #Guarda un snapshot comprimido
+        with open(path, "wb") as file:
+            file.write(zlib.compress(data if data is not None else self.snapshot(), 1))
+
+    def load_state(self, path): #Abre un guardado o un volcado de errores; de un volcado devuelve la acción del paso que falló (None si no la hay), así se puede repetir con step()
+        with open(path, "rb") as file:
+            data = file.read()
+        if data.startswith(RewindBuffer.MAGIC):
+            if self._rewind is None:
+                self._rewind = RewindBuffer(round(self.REWIND_SECONDS * self.FPS) or self.FPS, self.KEYFRAME_INTERVAL, self.FPS)
+            end = self.input_log.end()
+            pending = self._rewind.load(data, self)
+            self._resume_recording(end, self.snapshot())
+            return pending
+        self.restore(zlib.decompress(data))
+        return None
+
+    def dump_crash(self): #Vuelca el historial para poder reproducir un fallo, devuelve el fichero o None si no hay historial
+        if self._rewind is None:
+            return None
+        path = self.CRASH_DUMP % self.frame
+        self._rewind.save(path, self.frame)
+        return path
+
+    def snapshot_stats(self): #Coste en microsegundos de snapshots, restauraciones y rebobinados, y memoria del historial
+        stats = {name: {"mean_us": sum(times) / len(times) if times else 0.0, "max_us": max(times, default=0.0)}
+                 for name, times in self._snapshot_times.items()}
+        stats["snapshot_bytes"] = len(WorldSnapshot.capture(self))
+        if self._rewind is not None:
+            stats["history"] = self._rewind.stats()
+        return stats
+
+    def save_recording(self, path): #Guarda la partida actual junto con el hash de su estado
+        self.input_log.final_hash = self.state_hash()
+        self.input_log.save(path)
+
+    def simulate(self, frames, restart=False): #Modo headless: ejecuta la lógica con paso fijo tan rápido como permita la CPU, sin dibujar ni esperar al reloj
+        start = perf_counter()
+        steps = 0
+        while steps < frames:
+            if self.is_over():
+                if self._survival is not None:
+                    self._survival.finish(self)
+                if not restart:
                     break
-            self._boss.update()    
-            if self._boss.position == Vector2(512,200) and len(self._escudos) == 0: #Cuando el boss llegue a su posicón y comience la batalla aparecerán los escudos
-                self._escudos.extend(escudos)
-                self._bossLife = BossLife(self._screen,self._boss)
-             
-    def mainloop(self):
+                self.restart()
+            self._profiler.begin_frame()
+            if not self.step():
+                break
+            self._profiler.end_frame(self)
+            if self._survival is not None:
+                self._survival.observe(self, self._profiler.frames[-1])
+            steps += 1
+        elapsed = perf_counter() - start
+        return {"frames": steps,
+                "seconds": elapsed,
+                "simulated_seconds": steps * self.TIMESTEP,
+                "speedup": steps * self.TIMESTEP / elapsed if elapsed else 0.0,
+                "phase": self._phase,
+                "snapshots": self.snapshot_stats(),
+                "survival": self._survival.stats() if self._survival is not None else None}
+
+    def _save_recording(self):
+        if self.record_path is not None:
+            try:
+                self.save_recording(self.record_path)
+            except ValueError as error:
+                print("No se guarda %s: %s" % (self.record_path, error))
+        if self.profile_path is not None: #Se aprovecha para guardar también los tiempos de los frames
+            self.save_profile(self.profile_path)
+
+    def save_profile(self, path): #Exporta el historial del FrameProfiler y los .prof de los peores frames capturados
+        self._profiler.export(path)
+        return self._profiler.dump_worst(os.path.splitext(path)[0])
+
+    def render_fps(self): #RENDER_FPS o, si no se indica, la frecuencia de refresco de la pantalla
+        if self.RENDER_FPS is not None:
+            return self.RENDER_FPS
+        get_rates = getattr(pygame.display, "get_desktop_refresh_rates", None) #Solo existe en algunas versiones de pygame
+        rates = get_rates() if get_rates is not None and not self.headless else []
+        return rates[0] if rates and rates[0] > 0 else self.FPS
+
+    def mainloop(self): #Si el juego falla se vuelca el historial antes de terminar
+        try:
+            self._mainloop()
+        except Exception:
+            path = self.dump_crash()
+            if path is not None:
+                print("Historial de la partida guardado en %s" % path)
+            raise
+
+    def _mainloop(self): #Simulación de paso fijo con acumulador: cada frame se simulan los pasos que correspondan al tiempo real transcurrido y se dibuja interpolando entre los dos últimos
         clock = pygame.time.Clock()
+        render_fps = self.render_fps()
+        accumulator = 0.0
+        previous = perf_counter()
         while True:
-            while True:
-                # manage input from keyboard
-                self._handle_input()
-                # update
-                self.phase1()
-                # draw (double buffer by PyGame)
-                self._draw()
-                # time sync 60fps
-                clock.tick(60)
-                # when self._asteroids is empty, self._asteroids == False
-                if self._star_ship.is_disabled() or not self._asteroids: #Se termina el nivel si el jugador a muerto o a conseguido destruir todos los asteroides
-                    break
-            if not self._star_ship.is_disabled(): #Solo comenzará el siguiente nivel en caso de que el nivel anterior haya terminado y el jugador siga vivo
-                while True:
-                    self._handle_input()
-                    if not self._asteroids: #Se reponen los asteroides
-                        for _ in range(5):
-                            self._asteroids.append(Asteroid(self.SIZE, self._star_ship, category = 1))
-                    self.phase2()
-                    self._draw()
-                    # time sync 60fps
-                    clock.tick(60)
-                    if self._star_ship.is_disabled() or not self._asteroids: #Se termina el nivel si el jugador a muerto o a conseguido destruir todos los asteroides
-                        break
-                if not self._star_ship.is_disabled(): #Solo comenzará el siguiente nivel en caso de que el nivel anterior haya terminado y el jugador siga vivo
-                    self.MUSIC = 'music/bossmusic.ogg' #Se sustituye la musica de fondo por la música de jefe final
-                    pygame.mixer.init()
-                    pygame.mixer.music.load(self.MUSIC)
-                    pygame.mixer.Channel(1).play(pygame.mixer.Sound(self.MUSIC),-1)
-                    while True:
-                        self._handle_input()
-                        if self._boss is None:
-                            self._boss = Boss(self.SIZE, position=Vector2(512,-80), velocity=None)
-                        self.boss_phase()
-                        self._draw()
-                        # time sync 60fps
-                        clock.tick(60)
-                        if self._star_ship.is_disabled() or self._boss.LIVES==0:
-                            break
+            self._profiler.begin_frame()
+            now = perf_counter()
+            accumulator += min(now - previous, self.MAX_FRAME_TIME)
+            previous = now
+            self._frame_steps = 0
+            # manage input and update, as many fixed steps as real time has passed
+            while accumulator >= self.TIMESTEP and self._frame_steps < self.MAX_STEPS_PER_FRAME and not self.is_over():
+                if not self.step():
+                    self._save_recording()
+                    quit()
+                accumulator -= self.TIMESTEP
+                self._frame_steps += 1
+            if self._frame_steps == self.MAX_STEPS_PER_FRAME: #Demasiado retraso: se descarta el que queda en lugar de ir cada vez más atrás
+                accumulator = min(accumulator, self.TIMESTEP)
+            self._draw(accumulator / self.TIMESTEP if not self.is_over() else 1.0)
+            clock.tick(render_fps)
+            self._profiler.lap("idle")
+            self._profiler.end_frame(self)
+            if self._survival is not None:
+                self._survival.observe(self, self._profiler.frames[-1])
+            if not self.is_over():
+                continue
             # process endgame or restart
+            self._save_recording()
+            if self._survival is not None:
+                self._survival.finish(self)
             message = self.GAME_OVER_TEXT if self._star_ship.is_disabled() else self.VICTORY_TEXT
             print_text(self._screen, message, self._font) #Mensaje de game over
+            ended = perf_counter()
             while True:
                 pygame.display.flip()
-                clock.tick(60)
-                restart = False
-                for event in pygame.event.get():
-                    if event.type == pygame.QUIT or (event.type == pygame.KEYDOWN and event.key == pygame.K_ESCAPE): #Si se pulsa la tecla ESC se sale del juego
-                        quit()
-                    elif event.type == pygame.KEYDOWN and event.key == pygame.K_SPACE: #Si se pulsa la tecla SPACE se comienza una nueva partida
-                        self._init_objects()
-                        restart = True
-                        self.MUSIC = 'music/tota_pop.ogg' #La musica de fondo vuelve a ser la normal
-                        pygame.mixer.init()
-                        pygame.mixer.music.load(self.MUSIC)
-                        # loops=-1 for infinite playing
-                        pygame.mixer.Channel(1).play(pygame.mixer.Sound(self.MUSIC),-1)
-                if restart:
+                clock.tick(self.FPS)
+                actions = self._input.read()
+                if actions & Actions.QUIT: #Si se pulsa la tecla ESC se sale del juego
+                    quit()
+                elif actions & Actions.SHOOT or (self.AUTO_RESTART is not None and perf_counter() - ended >= self.AUTO_RESTART): #Si se pulsa la tecla SPACE se comienza una nueva partida
+                    self.restart()
+                    accumulator = 0.0
+                    previous = perf_counter()
+                    break
+                elif actions & (Actions.REWIND | Actions.QUICKLOAD): #También se puede volver atrás desde el final de la partida
+                    self._handle_commands(actions)
+                    accumulator = 0.0
+                    previous = perf_counter()
                     break
 
 
 if __name__ == '__main__':
-    myAsteroids = Asteroids()  # new Asteroids() en java
-    myAsteroids.mainloop()
+    parser = argparse.ArgumentParser(description=Asteroids.WINDOW_TITLE)
+    parser.add_argument("--headless", action="store_true", help="simula la partida sin ventana ni sonido")
+    parser.add_argument("--frames", type=int, default=60 * 60, help="frames a simular en modo headless")
+    parser.add_argument("--seed", type=int, help="semilla de la partida")
+    parser.add_argument("--record", metavar="FICHERO", help="graba las entradas de la partida en el fichero")
+    parser.add_argument("--replay", metavar="FICHERO", help="reproduce una grabación sin ventana y comprueba el estado final")
+    parser.add_argument("--seek", type=int, help="con --replay, se detiene en este frame")
+    parser.add_argument("--dirty-rects", action="store_true", help="solo redibuja las zonas de la pantalla que cambian")
+    parser.add_argument("--profile", metavar="FICHERO", help="guarda los tiempos de cada frame en JSON o CSV")
+    parser.add_argument("--build-atlas", action="store_true", help="empaqueta los sprites y el fondo escalado en Asteroids.ATLAS")
+    parser.add_argument("--profile-worst", type=int, default=0, metavar="N", help="con --profile, guarda también un cProfile de los N frames más lentos")
+    parser.add_argument("--load-state", metavar="FICHERO", help="empieza desde un guardado rápido o un volcado de errores")
+    parser.add_argument("--endless", action="store_true", help="modo supervivencia: oleadas cada vez mayores; en ventana la partida se reinicia sola")
+    parser.add_argument("--telemetry", metavar="FICHERO", help="en el modo supervivencia, añade una línea JSON por oleada con su carga")
+    args = parser.parse_args()
+    Asteroids.DIRTY_RECTS = args.dirty_rects
+    Asteroids.ENDLESS = args.endless
+    Asteroids.telemetry_path = args.telemetry
+    if args.endless:
+        Asteroids.AUTO_RESTART = 5
+    if args.build_atlas:
+        print("%s: %d sprites" % (Asteroids.ATLAS, len(Asteroids.build_atlas())))
+    elif args.replay:
+        replay = Replay(InputLog.load(args.replay))
+        if args.seek is not None:
+            replay.seek(args.seek)
+            print({"frame": replay.game.frame, "state_hash": replay.game.state_hash()})
+        else:
+            print(replay.run())
+    elif args.headless: #Jugador automático que gira y dispara sin parar, reiniciando la partida cada vez que termina
+        myAsteroids = Asteroids(headless=True, input_source=ScriptedInput([Actions.SHOOT | Actions.RIGHT] + [Actions.RIGHT] * 9, loop=True), seed=args.seed)
+        if args.load_state:
+            myAsteroids.load_state(args.load_state)
+        if args.profile_worst:
+            myAsteroids._profiler.capture_worst(args.profile_worst)
+        myAsteroids.record_path = args.record
+        myAsteroids.profile_path = args.profile
+        print(myAsteroids.simulate(args.frames, restart=True))
+        myAsteroids._save_recording()
+    else:
+        myAsteroids = Asteroids(seed=args.seed)  # new Asteroids() en java
+        myAsteroids.record_path = args.record
+        myAsteroids.profile_path = args.profile
+        if args.load_state:
+            myAsteroids.load_state(args.load_state)
+        if args.profile_worst:
+            myAsteroids._profiler.capture_worst(args.profile_worst)
+        myAsteroids.mainloop()
@@ -0,0 +1,552 @@
+######
+# Multijugador: un servidor que ejecuta la partida de forma autoritativa y envía el estado a los clientes por UDP
+# Uso: python server.py [--port 5050]                      servidor
+#      python server.py --connect 127.0.0.1:5050           cliente con ventana
+#      python server.py --load-test --clients 1 2 4 8 16   prueba de carga en este proceso
+import argparse
+import random
+import selectors
+import socket
+import struct
+from time import perf_counter, process_time
+
+import pygame
+from pygame.math import Vector2
+
+from oopAsteroids import Actions, Asteroids, KeyboardInput, ROTATIONS, TEXTS, load_image
+
+
+''' ******************************************************
+    ********              PROTOCOLO               ********
+    ******************************************************'''
+JOIN = b"J" #cliente -> servidor: quiere jugar
+LEAVE = b"L" #cliente -> servidor: se va
+INPUT = b"I" #cliente -> servidor: secuencia, último snapshot recibido y acciones
+WELCOME = b"W" #servidor -> cliente: número de jugador y frecuencias
+SNAPSHOT = b"S" #servidor -> cliente: estado del mundo, completo o como delta
+
+INPUT_PACKET = struct.Struct("<cIIB") #tipo, secuencia, tick confirmado, acciones
+WELCOME_PACKET = struct.Struct("<cBHH") #tipo, jugador, pasos por segundo, snapshots por segundo
+SNAPSHOT_HEADER = struct.Struct("<cIIIBBIHH") #tipo, tick, tick base (NO_BASE si es completo), uid de la nave propia, fase, vidas, puntos, eliminados, entidades
+NO_BASE = 0xFFFFFFFF
+UID = struct.Struct("<I")
+ENTITY_HEADER = struct.Struct("<IB") #uid y máscara de campos que siguen
+
+#Campos de una entidad en el snapshot: (tipo, x, y, vx, vy, ángulo, meta, flags)
+FULL = struct.Struct("<BhhhhBBB") #Entidad nueva para el cliente, todos los campos
+POS8 = struct.Struct("<bb") #Desplazamiento pequeño respecto a la posición base
+POS16 = struct.Struct("<hh")
+VEL = struct.Struct("<hh")
+META = struct.Struct("<BBB") #ángulo, categoría o vidas, flags
+F_FULL, F_POS8, F_POS16, F_VEL, F_META = 0x80, 0x01, 0x02, 0x04, 0x08
+
+POSITION_SCALE = 8 #Las posiciones viajan en octavos de píxel
+VELOCITY_SCALE = 64 #y las velocidades en sesentaicuatroavos de píxel por paso
+KINDS = {"ship": 0, "asteroid": 1, "bullet": 2, "enemy_bullet": 3, "escudo": 4, "boss": 5}
+FLAG_IMMUNE = 0x01
+FLAG_DEAD = 0x02
+PLAYER_ACTIONS = Actions.SHOOT | Actions.LEFT | Actions.RIGHT | Actions.UP | Actions.DOWN #Lo único que puede pedir un cliente; salir o el panel de tiempos afectarían a la partida de todos
+PHASES = ("phase1", "phase2", "boss_phase", "game_over", "victory", "endless")
+
+MAX_PACKET = 65507 #Tamaño máximo de un datagrama UDP
+
+
+def entity_state(obj, kind): #Campos de un objeto tal y como viajan por la red, ya cuantizados
+    position, velocity = obj.position, obj.velocity
+    angle = meta = flags = 0
+    if kind == KINDS["ship"]:
+        angle = int(obj.direction.angle_to(Vector2(0, -1)) % 360 * 256 / 360) & 0xFF
+        meta = obj.LIVES
+        flags = (FLAG_IMMUNE if obj.INMUNITY > 0 else 0) | (FLAG_DEAD if obj.is_disabled() else 0)
+    elif kind == KINDS["asteroid"]:
+        meta = obj.CATEGORY
+    elif kind == KINDS["boss"]:
+        meta = obj.LIVES
+    return (kind, int(round(position.x * POSITION_SCALE)), int(round(position.y * POSITION_SCALE)),
+            int(round(velocity.x * VELOCITY_SCALE)), int(round(velocity.y * VELOCITY_SCALE)), angle, meta, flags)
+
+
+def encode_snapshot(tick, base_tick, base, state, own_uid, phase, lives, score): #Codifica state ({uid: campos}) como delta respecto a base; las entidades sin cambios no se envían
+    removed = [uid for uid in base if uid not in state]
+    body = []
+    count = 0
+    for uid, fields in state.items():
+        old = base.get(uid)
+        if old is None:
+            body.append(ENTITY_HEADER.pack(uid, F_FULL) + FULL.pack(*fields))
+        elif old != fields:
+            mask = 0
+            parts = []
+            dx, dy = fields[1] - old[1], fields[2] - old[2]
+            if dx or dy:
+                if -128 <= dx < 128 and -128 <= dy < 128:
+                    mask |= F_POS8
+                    parts.append(POS8.pack(dx, dy))
+                else:
+                    mask |= F_POS16
+                    parts.append(POS16.pack(fields[1], fields[2]))
+            if fields[3:5] != old[3:5]:
+                mask |= F_VEL
+                parts.append(VEL.pack(fields[3], fields[4]))
+            if fields[5:] != old[5:]:
+                mask |= F_META
+                parts.append(META.pack(*fields[5:]))
+            body.append(ENTITY_HEADER.pack(uid, mask) + b"".join(parts))
+        else:
+            continue
+        count += 1
+    header = SNAPSHOT_HEADER.pack(SNAPSHOT, tick, base_tick, own_uid, PHASES.index(phase), lives, score, len(removed), count)
+    return header + b"".join(UID.pack(uid) for uid in removed) + b"".join(body)
+
+
+def decode_snapshot(packet, history): #Aplica un snapshot al estado base que guarda el cliente; devuelve (cabecera, estado) o None si no tiene la base
+    _, tick, base_tick, own_uid, phase, lives, score, removed, count = SNAPSHOT_HEADER.unpack_from(packet)
+    if base_tick == NO_BASE:
+        state = {}
+    elif base_tick in history:
+        state = dict(history[base_tick])
+    else:
+        return None
+    offset = SNAPSHOT_HEADER.size
+    for _ in range(removed):
+        state.pop(UID.unpack_from(packet, offset)[0], None)
+        offset += UID.size
+    for _ in range(count):
+        uid, mask = ENTITY_HEADER.unpack_from(packet, offset)
+        offset += ENTITY_HEADER.size
+        if mask & F_FULL:
+            state[uid] = FULL.unpack_from(packet, offset)
+            offset += FULL.size
+            continue
+        fields = list(state[uid])
+        if mask & F_POS8:
+            dx, dy = POS8.unpack_from(packet, offset)
+            fields[1] += dx
+            fields[2] += dy
+            offset += POS8.size
+        elif mask & F_POS16:
+            fields[1:3] = POS16.unpack_from(packet, offset)
+            offset += POS16.size
+        if mask & F_VEL:
+            fields[3:5] = VEL.unpack_from(packet, offset)
+            offset += VEL.size
+        if mask & F_META:
+            fields[5:8] = META.unpack_from(packet, offset)
+            offset += META.size
+        state[uid] = tuple(fields)
+    header = {"tick": tick, "base": base_tick, "own_uid": own_uid, "phase": PHASES[phase], "lives": lives, "score": score}
+    return header, state
+
+
+''' ******************************************************
+    ********               SERVIDOR               ********
+    ******************************************************'''
+class TickScheduler: #Marca cuándo toca el siguiente tick a una frecuencia fija, sin acumular deriva
+    def __init__(self, rate, now=None):
+        self.rate = rate
+        self.interval = 1 / rate
+        self.next = perf_counter() if now is None else now
+        self.ticks = 0
+
+    def due(self, now, limit=5): #Ticks pendientes hasta now, como mucho limit; si hay más retraso se descarta
+        pending = 0
+        while now >= self.next and pending < limit:
+            self.next += self.interval
+            pending += 1
+        if now >= self.next: #Demasiado retraso: se empieza a contar desde ahora
+            self.next = now + self.interval
+        self.ticks += pending
+        return pending
+
+
+class RemoteClient: #Estado que el servidor guarda de cada cliente
+    HISTORY = 64 #Snapshots enviados que se guardan para usarlos como base cuando el cliente los confirme
+
+    def __init__(self, address, player):
+        self.address = address
+        self.player = player #Número de jugador, el 0 controla la nave principal de la partida
+        self.ship = None
+        self.held = 0 #Acciones mantenidas (giro y motores), se aplican en cada paso
+        self.pressed = 0 #Disparos pendientes, cada uno se aplica en un solo paso
+        self.sequence = 0
+        self.acked = None #Último tick de snapshot confirmado
+        self.sent = {} #tick -> estado enviado
+        self.bytes_sent = 0
+        self.snapshots = 0
+
+
+class Server: #Ejecuta la partida de forma autoritativa y envía a cada cliente los objetos cercanos a su nave como delta del último snapshot confirmado
+    SNAPSHOT_RATE = 20 #Snapshots por segundo a cada cliente
+    INTEREST_RADIUS = 450 #Solo se envían los objetos a menos de esta distancia de la nave del cliente (con la pantalla envuelta); las naves y el boss siempre
+    MAX_PLAYERS = 32
+
+    def __init__(self, host="127.0.0.1", port=5050, seed=None, snapshot_rate=None):
+        self.game = Asteroids(headless=True, seed=seed, RECORD=False, REWIND_SECONDS=0) #El servidor no graba la partida ni guarda historial: el historial solo tiene las acciones de la nave principal y no podría reproducir las demás
+        self.snapshot_rate = snapshot_rate or self.SNAPSHOT_RATE
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+        self.socket.bind((host, port))
+        self.socket.setblocking(False)
+        self.address = self.socket.getsockname()
+        self.clients = {} #dirección -> RemoteClient
+        self.tick = 0
+        self.timings = {"input": 0.0, "simulation": 0.0, "snapshots": 0.0} #Segundos acumulados en cada parte
+
+    def close(self):
+        self.socket.close()
+
+    def _new_ship(self, player): #El jugador 0 lleva la nave principal mientras siga en juego; si ya la han eliminado (su dueño anterior se fue o murió) recibe una nueva
+        if player == 0 and not self.game._star_ship.is_disabled():
+            return self.game._star_ship
+        return self.game.add_player()
+
+    def _assign_ships(self): #Tras reiniciar la partida cada cliente vuelve a tener nave; si nadie ocupa el puesto 0 la nave principal queda fuera de la partida
+        for client in sorted(self.clients.values(), key=lambda client: client.player):
+            client.ship = self._new_ship(client.player)
+        if not self._primary_owned():
+            self.game.remove_player(self.game._star_ship)
+
+    def _primary_owned(self):
+        return any(client.ship is self.game._star_ship for client in self.clients.values())
+
+    def _join(self, address):
+        client = self.clients.get(address)
+        if client is None:
+            if len(self.clients) >= self.MAX_PLAYERS:
+                return
+            used = {client.player for client in self.clients.values()}
+            player = next(number for number in range(self.MAX_PLAYERS) if number not in used)
+            client = self.clients[address] = RemoteClient(address, player)
+            client.ship = self._new_ship(player)
+        self.socket.sendto(WELCOME_PACKET.pack(WELCOME, client.player, self.game.FPS, self.snapshot_rate), address)
+
+    def _leave(self, address):
+        client = self.clients.pop(address, None)
+        if client is not None and client.ship is not None:
+            self.game.remove_player(client.ship)
+
+    def receive(self): #Lee todos los paquetes pendientes sin bloquear
+        start = perf_counter()
+        while True:
+            try:
+                packet, address = self.socket.recvfrom(MAX_PACKET)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionResetError: #En Windows un cliente cerrado provoca este error en el siguiente recvfrom
+                continue
+            kind = packet[:1]
+            if kind == INPUT and len(packet) == INPUT_PACKET.size:
+                client = self.clients.get(address)
+                if client is None:
+                    continue
+                _, sequence, acked, actions = INPUT_PACKET.unpack(packet)
+                if sequence <= client.sequence: #Paquete antiguo o repetido
+                    continue
+                client.sequence = sequence
+                actions &= PLAYER_ACTIONS
+                client.held = actions & ~Actions.SHOOT
+                client.pressed |= actions & Actions.SHOOT
+                if acked in client.sent and (client.acked is None or acked > client.acked):
+                    client.acked = acked
+            elif kind == JOIN:
+                self._join(address)
+            elif kind == LEAVE:
+                self._leave(address)
+        self.timings["input"] += perf_counter() - start
+
+    def simulate(self): #Un paso de la partida con las acciones de todos los clientes
+        if not self.clients: #Sin jugadores la partida espera
+            return
+        start = perf_counter()
+        game = self.game
+        if game.is_over(): #La sesión no termina: se empieza otra partida con los mismos clientes
+            game.restart()
+            self._assign_ships()
+        primary = 0
+        players = {}
+        for client in self.clients.values():
+            actions = client.held | client.pressed
+            client.pressed = 0
+            if client.ship is game._star_ship:
+                primary = actions
+            else:
+                players[client.ship] = actions
+        game.step(primary, players)
+        self.tick += 1
+        self.timings["simulation"] += perf_counter() - start
+
+    def world(self): #Todos los objetos de la partida con su tipo
+        game = self.game
+        objects = [(ship, KINDS["ship"]) for ship in game._ships if ship is not game._star_ship or self._primary_owned()] #La nave principal sin jugador no se envía
+        objects += [(asteroid, KINDS["asteroid"]) for asteroid in game._asteroids if not asteroid._disabled]
+        objects += [(bullet, KINDS["bullet"]) for bullet in game._bullets if not bullet._disabled]
+        objects += [(bullet, KINDS["enemy_bullet"]) for bullet in game._bulletsEnemigos if not bullet._disabled]
+        objects += [(escudo, KINDS["escudo"]) for escudo in game._escudos if not escudo._disabled]
+        if game._boss is not None:
+            objects.append((game._boss, KINDS["boss"]))
+        return objects
+
+    def _visible(self, client, objects): #Interés: objetos cerca de la nave del cliente, midiendo la distancia con la pantalla envuelta
+        width, height = self.game.SIZE
+        center = client.ship.position
+        radius = self.INTEREST_RADIUS
+        state = {}
+        for obj, kind in objects:
+            if kind not in (KINDS["ship"], KINDS["boss"]):
+                dx = abs(obj.position.x - center.x)
+                dy = abs(obj.position.y - center.y)
+                dx, dy = min(dx, width - dx), min(dy, height - dy)
+                if dx * dx + dy * dy > radius * radius:
+                    continue
+            state[obj.uid] = entity_state(obj, kind)
+        return state
+
+    def broadcast(self): #Envía a cada cliente su snapshot
+        start = perf_counter()
+        objects = self.world()
+        game = self.game
+        for client in self.clients.values():
+            state = self._visible(client, objects)
+            base_tick = client.acked if client.acked in client.sent else NO_BASE
+            base = client.sent[base_tick] if base_tick != NO_BASE else {}
+            packet = encode_snapshot(self.tick, base_tick, base, state, client.ship.uid, game._phase,
+                                     client.ship.LIVES, game._score.score)
+            client.sent[self.tick] = state
+            for tick in [tick for tick in client.sent if tick < (client.acked or 0) or tick <= self.tick - RemoteClient.HISTORY]:
+                del client.sent[tick] #Las bases más antiguas que la confirmada ya no se van a usar
+            try:
+                self.socket.sendto(packet, client.address)
+            except (BlockingIOError, OSError): #Si el buffer está lleno se pierde este snapshot, el siguiente irá contra la misma base
+                continue
+            client.bytes_sent += len(packet)
+            client.snapshots += 1
+        self.timings["snapshots"] += perf_counter() - start
+
+    def serve_forever(self): #Bucle del servidor: pasos de simulación a Asteroids.FPS y snapshots a snapshot_rate
+        simulation = TickScheduler(self.game.FPS)
+        snapshots = TickScheduler(self.snapshot_rate)
+        selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ)
+        print("Servidor en %s:%d" % self.address)
+        try:
+            while True:
+                timeout = max(0.0, min(simulation.next, snapshots.next) - perf_counter())
+                selector.select(timeout)
+                self.receive()
+                now = perf_counter()
+                for _ in range(simulation.due(now)):
+                    self.simulate()
+                if snapshots.due(now):
+                    self.broadcast()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            selector.close()
+            self.close()
+
+
+''' ******************************************************
+    ********               CLIENTE                ********
+    ******************************************************'''
+class Client: #Envía las acciones del jugador y reconstruye el mundo a partir de los snapshots
+    HISTORY = 64
+
+    def __init__(self, address):
+        self.socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+        self.socket.connect(address)
+        self.socket.setblocking(False)
+        self.player = None
+        self.sequence = 0
+        self.tick = None #Último snapshot aplicado
+        self.header = None
+        self.world = {} #uid -> campos
+        self._history = {} #tick -> mundo, para aplicar los deltas
+        self.bytes_received = 0
+        self.dropped = 0 #Snapshots descartados por no tener su base
+
+    def join(self, timeout=2.0):
+        self.socket.send(JOIN)
+        selector = selectors.DefaultSelector()
+        selector.register(self.socket, selectors.EVENT_READ)
+        try:
+            deadline = perf_counter() + timeout
+            while perf_counter() < deadline:
+                selector.select(deadline - perf_counter())
+                try:
+                    packet = self.socket.recv(MAX_PACKET)
+                except BlockingIOError:
+                    continue
+                if packet[:1] == WELCOME:
+                    _, self.player, _, _ = WELCOME_PACKET.unpack(packet)
+                    return self.player
+        finally:
+            selector.close()
+        raise TimeoutError("El servidor no responde")
+
+    def leave(self):
+        self.socket.send(LEAVE)
+        self.socket.close()
+
+    def send_input(self, actions):
+        self.sequence += 1
+        acked = self.tick if self.tick is not None else NO_BASE
+        self.socket.send(INPUT_PACKET.pack(INPUT, self.sequence, acked, actions & 0xFF))
+
+    def poll(self): #Aplica los snapshots recibidos; devuelve cuántos
+        applied = 0
+        while True:
+            try:
+                packet = self.socket.recv(MAX_PACKET)
+            except (BlockingIOError, InterruptedError):
+                break
+            except ConnectionRefusedError: #El servidor aún no escucha o se ha cerrado
+                break
+            if packet[:1] != SNAPSHOT:
+                continue
+            self.bytes_received += len(packet)
+            tick = SNAPSHOT_HEADER.unpack_from(packet)[1]
+            if self.tick is not None and tick <= self.tick: #Llega desordenado, ya hay uno más nuevo
+                continue
+            decoded = decode_snapshot(packet, self._history)
+            if decoded is None:
+                self.dropped += 1
+                continue
+            self.header, self.world = decoded
+            self.tick = tick
+            self._history[tick] = self.world
+            base = self.header["base"] if self.header["base"] != NO_BASE else tick
+            for old in [old for old in self._history if old < base or old <= tick - self.HISTORY]:
+                del self._history[old] #El servidor nunca usa una base anterior a la última que ha usado
+            applied += 1
+        return applied
+
+
+class ClientView: #Ventana del cliente: dibuja el mundo recibido con los sprites del juego
+    SPRITES = {KINDS["asteroid"]: {1: "asteroid.v2", 2: "asteroid.v3", 3: "asteroid.v4"},
+               KINDS["bullet"]: "bullet",
+               KINDS["enemy_bullet"]: "bulletenemigo",
+               KINDS["escudo"]: "escudopng",
+               KINDS["boss"]: "Boss"}
+
+    def __init__(self, client):
+        self.client = client
+        pygame.init()
+        size = [int(value) for value in Asteroids.SIZE]
+        self.screen = pygame.display.set_mode(size)
+        pygame.display.set_caption("%s - jugador %d" % (Asteroids.WINDOW_TITLE, client.player))
+        self.background = pygame.transform.smoothscale(load_image(Asteroids.BACKGROUND), size)
+        self.font = pygame.font.Font(None, 40)
+
+    def draw(self):
+        screen = self.screen
+        screen.blit(self.background, (0, 0))
+        header = self.client.header
+        for uid, (kind, x, y, vx, vy, angle, meta, flags) in self.client.world.items():
+            position = Vector2(x, y) / POSITION_SCALE
+            if kind == KINDS["ship"]:
+                if flags & FLAG_DEAD:
+                    continue
+                sprite = load_image("invulnerable" if flags & FLAG_IMMUNE else "star_ship.v2")
+                sprite = ROTATIONS.get(sprite, angle * 360 / 256)
+            else:
+                sprite = self.SPRITES[kind]
+                sprite = load_image(sprite[meta] if isinstance(sprite, dict) else sprite)
+            screen.blit(sprite, sprite.get_rect(center=position))
+        if header is not None:
+            text = TEXTS.render(self.font, "Vidas %d   %d" % (header["lives"], header["score"]), pygame.Color("white"))
+            screen.blit(text, text.get_rect(topright=(screen.get_width() - 30, 30)))
+        pygame.display.flip()
+
+
+def play(address): #Cliente con ventana: lee el teclado, envía las acciones y dibuja los snapshots
+    client = Client(address)
+    client.join()
+    view = ClientView(client)
+    keyboard = KeyboardInput()
+    clock = pygame.time.Clock()
+    while True:
+        actions = keyboard.read()
+        if actions & Actions.QUIT:
+            break
+        client.send_input(actions)
+        client.poll()
+        view.draw()
+        clock.tick(Asteroids.FPS)
+    client.leave()
+    pygame.quit()
+
+
+''' ******************************************************
+    ********           PRUEBA DE CARGA            ********
+    ******************************************************'''
+def load_test(clients, seconds=10.0, snapshot_rate=None, seed=1): #Servidor y clientes en este proceso, sin esperar al reloj; mide el coste del servidor y los bytes por cliente
+    server = Server(port=0, seed=seed, snapshot_rate=snapshot_rate)
+    rng = random.Random(seed)
+    bots = [Client(server.address) for _ in range(clients)]
+    for bot in bots:
+        bot.socket.send(JOIN)
+    server.receive()
+    for bot in bots:
+        bot.poll()
+    ticks = int(seconds * server.game.FPS)
+    every = max(1, round(server.game.FPS / server.snapshot_rate))
+    start = process_time()
+    for tick in range(ticks):
+        for bot in bots:
+            bot.send_input(rng.choice((Actions.LEFT, Actions.RIGHT, Actions.UP)) | (Actions.SHOOT if rng.random() < 0.1 else 0))
+        server.receive()
+        server.simulate()
+        if tick % every == 0:
+            server.broadcast()
+            for bot in bots:
+                bot.poll()
+    cpu = process_time() - start
+    served = list(server.clients.values())
+    bytes_per_second = sum(client.bytes_sent for client in served) / len(served) / seconds
+    simulation_ms = server.timings["simulation"] / ticks * 1000 #Por paso
+    snapshot_ms = server.timings["snapshots"] / max(1, served[0].snapshots) / len(served) * 1000 #Por snapshot y cliente
+    input_ms = server.timings["input"] / ticks / len(served) * 1000 #Por paso y cliente
+    per_client = snapshot_ms * server.snapshot_rate + input_ms * server.game.FPS #ms de CPU por segundo de juego y cliente
+    capacity = (1000 - simulation_ms * server.game.FPS) / per_client if per_client else float("inf")
+    result = {"clients": clients,
+              "bytes_per_second_per_client": bytes_per_second,
+              "bytes_per_snapshot": bytes_per_second / server.snapshot_rate,
+              "simulation_ms_per_tick": simulation_ms,
+              "snapshot_ms_per_client": snapshot_ms,
+              "clients_per_core": int(capacity),
+              "dropped": sum(bot.dropped for bot in bots),
+              "cpu_seconds": cpu}
+    for bot in bots:
+        bot.leave()
+    server.close()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servidor multijugador de Asteroids")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=5050)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--snapshot-rate", type=int, default=Server.SNAPSHOT_RATE, help="snapshots por segundo a cada cliente")
+    parser.add_argument("--connect", metavar="HOST:PUERTO", help="juega conectándose a un servidor")
+    parser.add_argument("--load-test", action="store_true", help="mide ancho de banda por cliente y clientes por núcleo")
+    parser.add_argument("--clients", type=int, nargs="+", default=[1, 2, 4, 8, 16, 32])
+    parser.add_argument("--seconds", type=float, default=10.0, help="segundos de juego simulados en cada prueba de carga")
+    parser.add_argument("--endless", action="store_true", help="el servidor ejecuta el modo supervivencia")
+    args = parser.parse_args()
+    Asteroids.ENDLESS = args.endless
+    if args.connect:
+        host, port = args.connect.rsplit(":", 1)
+        play((host, int(port)))
+    elif args.load_test:
+        for clients in args.clients:
+            result = load_test(clients, args.seconds, args.snapshot_rate, args.seed or 1)
+            print("%3d clientes: %7.0f B/s por cliente (%5.0f B por snapshot), simulación %.3f ms/paso, snapshot %.3f ms/cliente, ~%d clientes por núcleo" %
+                  (clients, result["bytes_per_second_per_client"], result["bytes_per_snapshot"], result["simulation_ms_per_tick"],
+                   result["snapshot_ms_per_client"], result["clients_per_core"]))
+    else:
+        Server(args.host, args.port, args.seed, args.snapshot_rate).serve_forever()
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,17 @@
+import os
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+os.environ.setdefault("SDL_VIDEODRIVER", "dummy") #Sin ventana ni sonido, como el modo headless
+os.environ.setdefault("SDL_AUDIODRIVER", "dummy")
+os.chdir(ROOT) #Las imágenes y levels.json se leen con rutas relativas a la raíz del repositorio
+sys.path.insert(0, ROOT)
+
+from oopAsteroids import StarShip
+
+
+@pytest.fixture
+def lives(monkeypatch): #La nave no muere, así las partidas llegan a las fases que se quieren probar
+    monkeypatch.setattr(StarShip, "LIVES", 10 ** 6)
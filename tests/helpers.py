@@ -0,0 +1,42 @@
+######
+# Partidas de prueba compartidas por los tests: acciones deterministas y atajos para llegar a cada fase
+from oopAsteroids import Actions, Asteroids
+
+PATTERN = (Actions.SHOOT, Actions.SHOOT | Actions.LEFT, Actions.UP, Actions.SHOOT | Actions.RIGHT, 0, Actions.SHOOT) #Acciones que se repiten, disparando casi siempre
+
+
+def actions(frame):
+    return PATTERN[frame % len(PATTERN)] if frame % 7 else Actions.LEFT
+
+
+def play(game, frames):
+    for _ in range(frames):
+        game.step(actions(game.frame))
+
+
+def new_game(seed=7, level=0):
+    game = Asteroids(headless=True, seed=seed)
+    if level:
+        game._start_level(level)
+    return game
+
+
+def assert_same_future(game, restored, frames=120): #Las dos partidas siguen igual paso a paso con las mismas acciones
+    for _ in range(frames):
+        action = actions(game.frame)
+        game.step(action)
+        restored.step(action)
+        assert restored.state_hash() == game.state_hash()
+
+
+def boss_level(game):
+    return next(index for index, level in enumerate(game._levels) if level.phase == "boss_phase")
+
+
+def boss_fight(game): #Llega a la pelea con el boss sin disparar, si no el boss muere antes de que salgan los escudos
+    game._start_level(boss_level(game))
+    for frame in range(2000):
+        game.step(Actions.LEFT if frame % 2 else 0)
+        if game._escudos and game._bulletsEnemigos:
+            break
+    assert game._phase == "boss_phase" and game._bossLife is not None
@@ -0,0 +1,27 @@
+######
+# AsteroidsEnv: sus opciones son solo de su partida y en entrenamiento no se graba ni se guarda historial
+import pytest
+
+pytest.importorskip("numpy")
+
+from env import AsteroidsEnv
+from oopAsteroids import Actions, Asteroids
+
+
+def test_env_settings_are_per_instance(monkeypatch):
+    monkeypatch.setattr(Asteroids, "ENTITY_STORE", True)
+    env = AsteroidsEnv(seed=3, entity_store=False)
+    assert Asteroids.ENTITY_STORE
+    assert env.game._store is None
+    assert Asteroids(headless=True, seed=3)._store is not None
+
+
+def test_env_does_not_record_or_rewind():
+    env = AsteroidsEnv(seed=3)
+    env.reset()
+    for _ in range(50):
+        env.step(Actions.SHOOT)
+    assert env.game._rewind is None
+    assert len(env.game.input_log) == 0
+    with pytest.raises(ValueError):
+        env.game.input_log.save("partida.astr")
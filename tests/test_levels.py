@@ -0,0 +1,36 @@
+######
+# Validación de levels.json: los puntos del boss y de los escudos tienen que poder alcanzarse paso a paso
+import json
+
+import pytest
+
+from oopAsteroids import Asteroids, load_levels
+
+
+def write_levels(tmp_path, boss, escudos=((512, 50),)):
+    path = tmp_path / "levels.json"
+    path.write_text(json.dumps({"levels": [{"phase": "boss_phase", "boss": boss, "escudos": [list(p) for p in escudos]}]}))
+    return str(path)
+
+
+BOSS = {"spawn": [512, -80], "arrival": [512, 200], "patrol": 312, "lives": 6}
+
+
+def test_shipped_levels_load():
+    assert load_levels(Asteroids.LEVELS)
+
+
+def test_reachable_boss_level_loads(tmp_path):
+    assert load_levels(write_levels(tmp_path, BOSS))[0].boss["arrival"] == (512, 200)
+
+
+@pytest.mark.parametrize("change", [{"arrival": [512, 200.3]}, {"arrival": [500, 200]}, {"arrival": [512, -100]}, {"patrol": 312.5}],
+                         ids=["arrival_between_steps", "arrival_off_path", "arrival_above_spawn", "patrol_not_integer"])
+def test_unreachable_boss_waypoints_are_rejected(tmp_path, change):
+    with pytest.raises(ValueError):
+        load_levels(write_levels(tmp_path, dict(BOSS, **change)))
+
+
+def test_unreachable_escudo_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        load_levels(write_levels(tmp_path, BOSS, escudos=[(452.25, 70)]))
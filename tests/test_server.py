@@ -0,0 +1,86 @@
+######
+# Snapshots de red de server.py: completos y como delta de un tick anterior, sin perder nada al decodificar
+import pytest
+
+from helpers import actions, boss_fight
+from oopAsteroids import StarShip
+from server import NO_BASE, Server, decode_snapshot, encode_snapshot, entity_state
+
+
+@pytest.fixture
+def server(monkeypatch):
+    monkeypatch.setattr(StarShip, "LIVES", 200) #Las vidas viajan en un byte
+    server = Server(port=0, seed=3)
+    yield server
+    server.close()
+
+
+def world_state(server): #Estado de red de todos los objetos de la partida, sin filtrar por interés
+    return {obj.uid: entity_state(obj, kind) for obj, kind in server.world()}
+
+
+def advance(server, frames):
+    for _ in range(frames):
+        server.game.step(actions(server.game.frame))
+
+
+def test_network_full_snapshot(server):
+    advance(server, 60)
+    state = world_state(server)
+    game = server.game
+    packet = encode_snapshot(60, NO_BASE, {}, state, game._star_ship.uid, game._phase, game._star_ship.LIVES, game._score.score)
+    header, decoded = decode_snapshot(packet, {})
+    assert decoded == state
+    assert header == {"tick": 60, "base": NO_BASE, "own_uid": game._star_ship.uid, "phase": game._phase,
+                      "lives": game._star_ship.LIVES, "score": game._score.score}
+
+
+def test_network_delta_against_base_tick(server):
+    advance(server, 60)
+    base = world_state(server)
+    advance(server, 5)
+    state = world_state(server)
+    removed = next(iter(base)) #Un objeto que desaparece, otro que salta lejos (POS16) y otro nuevo
+    state.pop(removed, None)
+    jumped = next(uid for uid in state if uid in base)
+    state[jumped] = (state[jumped][0], state[jumped][1] + 4000) + state[jumped][2:]
+    state[10 ** 6] = (1, 8, 8, 64, -64, 0, 2, 0)
+    packet = encode_snapshot(65, 60, base, state, 1, "phase1", 3, 0)
+    full = encode_snapshot(65, NO_BASE, {}, state, 1, "phase1", 3, 0)
+    assert len(packet) < len(full)
+    header, decoded = decode_snapshot(packet, {60: base})
+    assert header["base"] == 60
+    assert decoded == state
+    assert decode_snapshot(packet, {59: base}) is None #Sin la base el cliente descarta el delta
+
+
+def test_network_boss_phase(server):
+    game = server.game
+    boss_fight(game)
+    base = world_state(server)
+    advance(server, 3)
+    state = world_state(server)
+    packet = encode_snapshot(2, 1, base, state, game._star_ship.uid, game._phase, game._star_ship.LIVES, game._score.score)
+    header, decoded = decode_snapshot(packet, {1: base})
+    assert header["phase"] == "boss_phase"
+    assert decoded == state
+
+
+def test_restart_without_player_zero_removes_main_ship(server):
+    first, second = ("127.0.0.1", 9), ("127.0.0.1", 10)
+    server._join(first)
+    server._join(second)
+    server._leave(first)
+    server.game._set_phase("game_over")
+    server.simulate()
+    game = server.game
+    assert game._star_ship.is_disabled()
+    assert server.clients[second].ship in game._ships and not server.clients[second].ship.is_disabled()
+    assert all(obj is not game._star_ship for obj, _ in server.world())
+
+
+def test_server_keeps_no_rewind_history(server):
+    server._join(("127.0.0.1", 9))
+    for _ in range(60):
+        server.simulate()
+    assert server.game._rewind is None and server.game.dump_crash() is None
@@ -0,0 +1,88 @@
+######
+# Formato binario de WorldSnapshot (guardado rápido y rebobinado): codificar y decodificar no cambia el estado de la partida
+import pytest
+
+from helpers import assert_same_future, boss_fight, new_game, play
+from oopAsteroids import Actions, Asteroids, InputLog, Replay, np
+
+
+@pytest.fixture(params=[False, True], ids=["lists", "entity_store"])
+def entity_store(request, monkeypatch):
+    if request.param and np is None:
+        pytest.skip("NumPy no está instalado")
+    monkeypatch.setattr(Asteroids, "ENTITY_STORE", request.param)
+    return request.param
+
+
+def test_roundtrip_keeps_state_hash(lives, entity_store):
+    game = new_game()
+    play(game, 400)
+    assert game._asteroids and game._bullets
+    data = game.snapshot()
+    restored = new_game(seed=1)
+    restored.restore(data)
+    assert restored.state_hash() == game.state_hash()
+    assert restored.snapshot() == data
+    assert_same_future(game, restored)
+
+
+def test_roundtrip_boss_phase(lives, entity_store):
+    game = new_game()
+    boss_fight(game)
+    data = game.snapshot()
+    restored = new_game(seed=1) #Empieza en otro nivel, restore cambia de nivel, fase y sistemas
+    restored.restore(data)
+    assert restored._phase == "boss_phase"
+    assert restored._boss.LIVES == game._boss.LIVES
+    assert restored.state_hash() == game.state_hash()
+    assert restored.snapshot() == data
+    assert_same_future(game, restored)
+
+
+def test_rewind_resimulates_same_states(lives):
+    game = new_game()
+    hashes = {}
+    for _ in range(200):
+        play(game, 1)
+        hashes[game.frame] = game.state_hash()
+    assert game.rewind(75) == 125
+    assert game.state_hash() == hashes[125]
+
+
+def test_restore_rejects_other_data():
+    game = new_game()
+    data = bytearray(game.snapshot())
+    data[:4] = b"XXXX"
+    with pytest.raises(ValueError):
+        game.restore(bytes(data))
+
+
+def test_recording_after_load_state_replays(lives, tmp_path):
+    saved = new_game(seed=11)
+    play(saved, 300)
+    saved.save_state(str(tmp_path / "quicksave.snap"))
+    game = new_game(seed=99)
+    game.load_state(str(tmp_path / "quicksave.snap"))
+    assert game.input_log.seed == 11 and game.input_log.first == 300
+    play(game, 200)
+    game.save_recording(str(tmp_path / "partida.astr"))
+    replay = Replay(InputLog.load(str(tmp_path / "partida.astr")))
+    result = replay.run()
+    assert result["frames"] == 200 and result["matches"]
+
+
+def test_recording_refuses_state_inside_log(lives, tmp_path):
+    game = new_game()
+    play(game, 100)
+    data = game.snapshot()
+    play(game, 50)
+    game.restore(data) #Podría ser de otra partida: lo grabado ya pasa de su frame
+    with pytest.raises(ValueError):
+        game.save_recording(str(tmp_path / "partida.astr"))
+
+
+def test_overlay_is_not_recorded():
+    game = new_game()
+    game.step(Actions.OVERLAY | Actions.SHOOT)
+    assert game._profiler.overlay
+    assert game.input_log.actions == bytearray([Actions.SHOOT])
@@ -0,0 +1,57 @@
+######
+# Modo supervivencia: los snapshots guardan la oleada, el recorte y la telemetría, y solo se restauran en el mismo modo
+import pytest
+
+from helpers import assert_same_future, new_game
+from oopAsteroids import Asteroids, InputLog, Replay, Survival
+from server import NO_BASE, decode_snapshot, encode_snapshot
+
+
+def test_roundtrip_survival_state(lives, monkeypatch):
+    monkeypatch.setattr(Asteroids, "ENDLESS", True)
+    monkeypatch.setattr(Survival, "WAVE_TIME", 2)
+    game = new_game()
+    game.simulate(400)
+    survival = game._survival
+    assert survival.telemetry and survival._wave is not None
+    data = game.snapshot()
+    restored = new_game(seed=1)
+    restored.restore(data)
+    assert restored.state_hash() == game.state_hash()
+    assert restored.snapshot() == data
+    assert restored._survival._wave == survival._wave
+    assert restored._survival.governor.level == survival.governor.level
+    assert_same_future(game, restored)
+
+
+def test_restore_rejects_other_game_mode(monkeypatch):
+    data = new_game().snapshot()
+    monkeypatch.setattr(Asteroids, "ENDLESS", True)
+    with pytest.raises(ValueError):
+        new_game().restore(data)
+
+
+def test_network_endless_phase():
+    packet = encode_snapshot(1, NO_BASE, {}, {}, 1, "endless", 3, 0)
+    assert decode_snapshot(packet, {})[0]["phase"] == "endless"
+
+
+def test_replay_applies_recorded_mode(lives, monkeypatch, tmp_path):
+    monkeypatch.setattr(Asteroids, "ENDLESS", True)
+    monkeypatch.setattr(Survival, "WAVE_TIME", 2)
+    game = new_game()
+    game.simulate(300)
+    game.save_recording(str(tmp_path / "partida.astr"))
+    monkeypatch.setattr(Asteroids, "ENDLESS", False) #Se reproduce sin --endless
+    replay = Replay(InputLog.load(str(tmp_path / "partida.astr")))
+    assert replay.game._survival is not None
+    assert replay.run()["matches"]
+
+
+def test_replay_rejects_other_levels(tmp_path):
+    game = new_game()
+    game.step(0)
+    game.input_log.levels = b"otro.json"[:8]
+    game.save_recording(str(tmp_path / "partida.astr"))
+    with pytest.raises(ValueError):
+        Replay(InputLog.load(str(tmp_path / "partida.astr")))